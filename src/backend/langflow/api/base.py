@@ -7,6 +7,10 @@ class CacheResponse(BaseModel):
     data: dict
 
 
+class ExecutorResponse(BaseModel):
+    data: dict
+
+
 class Code(BaseModel):
     code: str
 
@@ -1,9 +1,78 @@
 import asyncio
-from typing import Any
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
 
 from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from langchain.callbacks.stdout import StdOutCallbackHandler
 
 from langflow.api.schemas import ChatResponse
+from langflow.settings import settings
+from langflow.utils.logger import logger
+
+
+class TokenStream:
+    """
+    Coalesces the tokens of a response into fewer stream frames.
+
+    The tokens are sent every flush_interval seconds or as soon as they
+    reach flush_bytes, whichever comes first. Each frame is a regular
+    stream response whose message is the text of several tokens, so the
+    frontend appends them as before. It runs on the loop of the websocket.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        flush_interval: Optional[float] = None,
+        flush_bytes: Optional[int] = None,
+    ):
+        self.websocket = websocket
+        self.flush_interval = (
+            settings.stream_flush_interval_ms / 1000
+            if flush_interval is None
+            else flush_interval
+        )
+        self.flush_bytes = (
+            settings.stream_flush_bytes if flush_bytes is None else flush_bytes
+        )
+        self._tokens: List[str] = []
+        self._size = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    def add(self, token: str) -> bool:
+        """Buffer a token, True if the buffer should be flushed now."""
+        self._tokens.append(token)
+        self._size += len(token.encode("utf-8"))
+        if self._size >= self.flush_bytes or self.flush_interval <= 0:
+            return True
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self.flush())
+            )
+        return False
+
+    async def push(self, token: str) -> None:
+        if self.add(token):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Send the buffered tokens in a single frame."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # The lock keeps the frames in order
+        async with self._lock:
+            if not self._tokens:
+                return
+            message = "".join(self._tokens)
+            self._tokens.clear()
+            self._size = 0
+            resp = ChatResponse(message=message, type="stream", intermediate_steps="")
+            await self.websocket.send_json(resp.dict())
 
 
 # https://github.com/hwchase17/chat-langchain/blob/master/callback.py
@@ -12,21 +81,185 @@ class AsyncStreamingLLMCallbackHandler(AsyncCallbackHandler):
 
     def __init__(self, websocket):
         self.websocket = websocket
+        self.stream = TokenStream(websocket)
 
     async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        resp = ChatResponse(message=token, type="stream", intermediate_steps="")
-        await self.websocket.send_json(resp.dict())
+        await self.stream.push(token)
+
+    async def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        await self.stream.flush()
+
+    async def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        await self.stream.flush()
+
+
+class StreamBridge:
+    """
+    Carries the tokens of a chain running on another thread to the websocket.
+
+    It is created on the loop of the server, where a single task sends the
+    queued tokens. At most max_queued tokens wait to be sent: when a slow
+    client fills the queue, the chain waits up to put_timeout seconds for
+    room and then drops the tokens, without waiting, until the queue is
+    drained. The final response has the whole text, so only intermediate
+    stream frames are lost. Flushing waits up to flush_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        max_queued: Optional[int] = None,
+        put_timeout: Optional[float] = None,
+        flush_timeout: Optional[float] = None,
+    ):
+        # Raises if there is no running loop, it must be created on the server
+        self.loop = asyncio.get_running_loop()
+        self.stream = TokenStream(websocket)
+        self.put_timeout = (
+            settings.stream_put_timeout if put_timeout is None else put_timeout
+        )
+        self.flush_timeout = (
+            settings.stream_flush_timeout if flush_timeout is None else flush_timeout
+        )
+        self._slots = threading.BoundedSemaphore(
+            settings.stream_queue_size if max_queued is None else max_queued
+        )
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+        # Set when a token could not be queued, until the queue is drained
+        self._dropping = False
+        self.dropped = 0
+        self._sender = self.loop.create_task(self._send())
+
+    def put(self, token: str) -> bool:
+        """Queue a token from any thread, False if it was dropped."""
+        if (
+            self._closed
+            or self._dropping
+            or not self._slots.acquire(timeout=self.put_timeout)
+        ):
+            self._dropping = not self._closed
+            self.dropped += 1
+            return False
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, token)
+        return True
+
+    def flush(self) -> None:
+        """Send the queued tokens, waiting for them unless on the loop thread."""
+        if self._closed:
+            return
+        done: "Future[None]" = Future()
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, done)
+        if not _is_loop_thread(self.loop):
+            try:
+                done.result(timeout=self.flush_timeout)
+            except FutureTimeoutError:
+                logger.debug("The streamed tokens were not sent in time")
+
+    async def _send(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if self._queue.empty():
+                # Drained, the chain can wait for room again
+                self._dropping = False
+            try:
+                if isinstance(item, Future):
+                    if not self._closed:
+                        await self.stream.flush()
+                    item.set_result(None)
+                    continue
+                self._slots.release()
+                if not self._closed:
+                    await self.stream.push(item)
+            except Exception as exc:
+                # The client is gone, the remaining tokens are dropped
+                logger.debug(f"Error streaming to the client: {exc}")
+                self._closed = True
+                if isinstance(item, Future) and not item.done():
+                    item.set_result(None)
+
+    async def aclose(self) -> None:
+        """Send what is left and stop the sender."""
+        done: "Future[None]" = Future()
+        self._queue.put_nowait(done)
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(done), self.flush_timeout)
+        except asyncio.TimeoutError:
+            logger.debug("The streamed tokens were not sent in time, closing")
+        self._closed = True
+        self._sender.cancel()
 
 
 class StreamingLLMCallbackHandler(BaseCallbackHandler):
-    """Callback handler for streaming LLM responses."""
+    """Callback handler for streaming LLM responses of synchronous chains."""
 
-    def __init__(self, websocket):
+    def __init__(self, websocket, bridge: Optional[StreamBridge] = None):
         self.websocket = websocket
+        # Created here, on the loop of the server, unless one is given
+        self.bridge = bridge or StreamBridge(websocket)
 
     def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
-        resp = ChatResponse(message=token, type="stream", intermediate_steps="")
+        self.bridge.put(token)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        # The tokens are sent before the end of the response
+        self.bridge.flush()
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.bridge.flush()
+
+
+def _is_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+class VerboseOutputCallbackHandler(StdOutCallbackHandler):
+    """
+    Collects what a verbose chain prints, for this call only.
+
+    Chains only add their printing handler when none is given, so with
+    this one the output goes to a buffer instead of the shared stdout.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._output: List[str] = []
+
+    def getvalue(self) -> str:
+        return "".join(self._output)
+
+    def _write(self, text: str, end: str = "") -> None:
+        self._output.append(f"{text}{end}")
+
+    def on_chain_start(
+        self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any
+    ) -> None:
+        self._write(f"\n\n> Entering new {serialized['name']} chain...", end="\n")
+
+    def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any) -> None:
+        self._write("\n> Finished chain.", end="\n")
+
+    def on_agent_action(self, action: Any, **kwargs: Any) -> Any:
+        self._write(action.log)
+
+    def on_tool_end(
+        self,
+        output: str,
+        observation_prefix: Optional[str] = None,
+        llm_prefix: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        if observation_prefix is not None:
+            self._write(f"\n{observation_prefix}")
+        self._write(output)
+        if llm_prefix is not None:
+            self._write(f"\n{llm_prefix}")
+
+    def on_text(self, text: str, end: str = "", **kwargs: Any) -> None:
+        self._write(text, end=end)
 
-        loop = asyncio.get_event_loop()
-        coroutine = self.websocket.send_json(resp.dict())
-        asyncio.run_coroutine_threadsafe(coroutine, loop)
+    def on_agent_finish(self, finish: Any, **kwargs: Any) -> None:
+        self._write(finish.log, end="\n")
@@ -1,46 +1,97 @@
 import asyncio
+import functools
 import json
-from collections import defaultdict
-from typing import Dict, List
+import os
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 from fastapi import WebSocket, status
 
 from langflow.api.schemas import ChatMessage, ChatResponse, FileResponse
+from langflow.api.sessions import SessionStore, get_session_store
 from langflow.cache import cache_manager
 from langflow.cache.manager import Subject
 from langflow.interface.run import (
+    aload_or_build_langchain_object,
     get_result_and_steps,
-    load_or_build_langchain_object,
 )
 from langflow.interface.utils import pil_to_base64, try_setting_streaming_options
+from langflow.settings import settings
 from langflow.utils.logger import logger
 
+T = TypeVar("T")
+
+# Seconds between two evictions of the idle sessions, at most
+EVICTION_INTERVAL = 60
+
+
+def encode_file_data(data: Any, data_type: str) -> Any:
+    """Encode a file as it is sent to the client, before it is stored."""
+    if data_type == "image":
+        return pil_to_base64(data)
+    if hasattr(data, "to_csv"):
+        return data.to_csv()
+    return data
+
 
 class ChatHistory(Subject):
-    def __init__(self):
+    """History of the chats, kept in a session store shared by the workers."""
+
+    def __init__(self, store: Optional[SessionStore] = None):
         super().__init__()
-        self.history: Dict[str, List[ChatMessage]] = defaultdict(list)
+        self._store = store
+
+    @property
+    def store(self) -> SessionStore:
+        # The shared store is created lazily, in the process that uses it
+        return self._store or get_session_store()
 
     def add_message(self, client_id: str, message: ChatMessage):
         """Add a message to the chat history."""
 
-        self.history[client_id].append(message)
+        self.store.add_message(client_id, message)
 
         if not isinstance(message, FileResponse):
             self.notify()
 
     def get_history(self, client_id: str, filter=True) -> List[ChatMessage]:
         """Get the chat history for a client."""
-        if history := self.history.get(client_id, []):
-            if filter:
-                return [msg for msg in history if msg.type not in ["start", "stream"]]
-            return history
-        else:
-            return []
+        return self.store.get_messages(client_id, filter)
+
+    def count_messages(self, client_id: str) -> int:
+        """Count the messages shown to a client."""
+        return self.store.count_messages(client_id)
+
+    def get_last_message(self, client_id: str) -> Optional[ChatMessage]:
+        return self.store.get_last_message(client_id)
+
+    def get_last_turn(self, client_id: str) -> List[ChatMessage]:
+        """Get the messages added since the last question of a client."""
+        return self.store.get_last_turn(client_id)
+
+    def get_history_page(
+        self, client_id: str, offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[ChatMessage], int]:
+        """Get a page of the filtered history and the number of messages."""
+        return self.store.get_page(client_id, offset, limit)
 
     def empty_history(self, client_id: str):
         """Empty the chat history for a client."""
-        self.history[client_id] = []
+        self.store.clear(client_id)
+
+    def evict_idle(self, max_idle: Optional[float], active: Iterable[str] = ()):
+        """Remove the histories of the clients that are idle, but the active ones."""
+        self.store.evict_idle(max_idle, active)
 
 
 class ChatManager:
@@ -49,26 +100,39 @@ class ChatManager:
         self.chat_history = ChatHistory()
         self.cache_manager = cache_manager
         self.cache_manager.attach(self.update)
+        # The loop of the server, set when the first connection is accepted
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evicted_at = float("-inf")
 
     def on_chat_history_update(self):
         """Send the last chat message to the client."""
         client_id = self.cache_manager.current_client_id
         if client_id in self.active_connections:
-            chat_response = self.chat_history.get_history(client_id, filter=False)[-1]
-            if chat_response.is_bot:
-                # Process FileResponse
-                if isinstance(chat_response, FileResponse):
-                    # If data_type is pandas, convert to csv
-                    if chat_response.data_type == "pandas":
-                        chat_response.data = chat_response.data.to_csv()
-                    elif chat_response.data_type == "image":
-                        # Base64 encode the image
-                        chat_response.data = pil_to_base64(chat_response.data)
-                # get event loop
-                loop = asyncio.get_event_loop()
-
-                coroutine = self.send_json(client_id, chat_response)
-                asyncio.run_coroutine_threadsafe(coroutine, loop)
+            chat_response = self.chat_history.get_last_message(client_id)
+            if chat_response is not None and chat_response.is_bot:
+                self.send_json_threadsafe(client_id, chat_response)
+
+    def send_json_threadsafe(self, client_id: str, message: ChatMessage):
+        """Send a message from any thread through the loop of the server."""
+        if self.loop is None:
+            logger.debug("No connection was accepted yet, the message is dropped")
+            return
+        coroutine = self.send_json(client_id, message)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.loop.create_task(coroutine)
+        else:
+            asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def run_store(self, func: Callable[..., T], *args: Any) -> T:
+        """Call the session store without blocking the loop on its I/O."""
+        if not self.chat_history.store.blocking:
+            return func(*args)
+        # The thread keeps the context, e.g. the current client
+        return await asyncio.to_thread(func, *args)
 
     def update(self):
         if self.cache_manager.current_client_id in self.active_connections:
@@ -77,7 +141,10 @@ class ChatManager:
             chat_response = FileResponse(
                 message=None,
                 type="file",
-                data=self.last_cached_object_dict["obj"],
+                data=encode_file_data(
+                    self.last_cached_object_dict["obj"],
+                    self.last_cached_object_dict["type"],
+                ),
                 data_type=self.last_cached_object_dict["type"],
             )
 
@@ -86,11 +153,68 @@ class ChatManager:
             )
 
     async def connect(self, client_id: str, websocket: WebSocket):
+        self.loop = asyncio.get_running_loop()
         await websocket.accept()
         self.active_connections[client_id] = websocket
+        # The session may be resumed from another worker
+        await self.run_store(
+            functools.partial(
+                self.chat_history.store.update_metadata,
+                client_id,
+                worker=os.getpid(),
+                connected_at=time.time(),
+            )
+        )
+        await self.evict_idle_sessions()
 
-    def disconnect(self, client_id: str):
+    async def disconnect(self, client_id: str):
         self.active_connections.pop(client_id, None)
+        await self.evict_idle_sessions()
+
+    async def evict_idle_sessions(self):
+        """Remove the idle sessions, at most once every EVICTION_INTERVAL seconds."""
+        max_idle = settings.chat_history_idle_ttl
+        if max_idle is None:
+            return
+        now = time.monotonic()
+        if now - self._evicted_at < min(max_idle, EVICTION_INTERVAL):
+            return
+        self._evicted_at = now
+        await self.run_store(
+            self.chat_history.evict_idle, max_idle, list(self.active_connections)
+        )
+
+    async def send_history_page(self, client_id: str, page: Any):
+        """Send the messages before the offset most recent ones."""
+        offset = page.get("offset", 0) if isinstance(page, dict) else None
+        limit = (
+            page.get("limit", settings.chat_history_page_size)
+            if isinstance(page, dict)
+            else None
+        )
+        if not all(
+            isinstance(value, int) and not isinstance(value, bool) and value >= 0
+            for value in [offset, limit]
+        ):
+            error = ChatResponse(
+                message="get_history must be an object with a non-negative "
+                "integer offset and limit",
+                type="error",
+                intermediate_steps="",
+            )
+            await self.send_json(client_id, error)
+            return
+        messages, total = await self.run_store(
+            self.chat_history.get_history_page, client_id, offset, limit
+        )
+        await self.active_connections[client_id].send_json(
+            {
+                "type": "history",
+                "messages": [message.dict() for message in messages],
+                "offset": offset,
+                "total": total,
+            }
+        )
 
     async def send_message(self, client_id: str, message: str):
         websocket = self.active_connections[client_id]
@@ -104,13 +228,15 @@ class ChatManager:
         # Process the graph data and chat message
         chat_message = payload.pop("message", "")
         chat_message = ChatMessage(message=chat_message)
-        self.chat_history.add_message(client_id, chat_message)
+        await self.run_store(self.chat_history.add_message, client_id, chat_message)
 
         graph_data = payload
         start_resp = ChatResponse(message=None, type="start", intermediate_steps="")
         await self.send_json(client_id, start_resp)
 
-        is_first_message = len(self.chat_history.get_history(client_id=client_id)) == 0
+        is_first_message = (
+            await self.run_store(self.chat_history.count_messages, client_id) == 0
+        )
         # Generate result and thought
         try:
             logger.debug("Generating result and thought")
@@ -120,26 +246,22 @@ class ChatManager:
                 is_first_message=is_first_message,
                 chat_message=chat_message,
                 websocket=self.active_connections[client_id],
+                load_history=functools.partial(
+                    self.run_store, self.chat_history.get_history, client_id
+                ),
             )
         except Exception as e:
             # Log stack trace
             logger.exception(e)
-            self.chat_history.empty_history(client_id)
+            await self.run_store(self.chat_history.empty_history, client_id)
             raise e
         # Send a response back to the frontend, if needed
         intermediate_steps = intermediate_steps or ""
-        history = self.chat_history.get_history(client_id, filter=False)
-        file_responses = []
-        if history:
-            # Iterate backwards through the history
-            for msg in reversed(history):
-                if isinstance(msg, FileResponse):
-                    if msg.data_type == "image":
-                        # Base64 encode the image
-                        msg.data = pil_to_base64(msg.data)
-                    file_responses.append(msg)
-                if msg.type == "start":
-                    break
+        # Only the files of this answer, the newest first
+        last_turn = await self.run_store(self.chat_history.get_last_turn, client_id)
+        file_responses = [
+            msg for msg in reversed(last_turn) if isinstance(msg, FileResponse)
+        ]
 
         response = ChatResponse(
             message=result,
@@ -148,16 +270,21 @@ class ChatManager:
             files=file_responses,
         )
         await self.send_json(client_id, response)
-        self.chat_history.add_message(client_id, response)
+        await self.run_store(self.chat_history.add_message, client_id, response)
 
     async def handle_websocket(self, client_id: str, websocket: WebSocket):
         await self.connect(client_id, websocket)
 
         try:
-            chat_history = self.chat_history.get_history(client_id)
+            # Only the most recent messages, older ones are sent on request
+            chat_history, _ = await self.run_store(
+                self.chat_history.get_history_page,
+                client_id,
+                0,
+                settings.chat_history_page_size,
+            )
             # iterate and make BaseModel into dict
-            chat_history = [chat.dict() for chat in chat_history]
-            await websocket.send_json(chat_history)
+            await websocket.send_json([chat.dict() for chat in chat_history])
 
             while True:
                 json_payload = await websocket.receive_json()
@@ -166,8 +293,13 @@ class ChatManager:
                 except TypeError:
                     payload = json_payload
                 if "clear_history" in payload:
-                    self.chat_history.history[client_id] = []
+                    await self.run_store(self.chat_history.empty_history, client_id)
+                    continue
+                if "get_history" in payload:
+                    await self.send_history_page(client_id, payload["get_history"])
                     continue
+                # Long lived connections don't disconnect to evict the others
+                await self.evict_idle_sessions()
 
                 with self.cache_manager.set_client_id(client_id):
                     await self.process_message(client_id, payload)
@@ -179,16 +311,16 @@ class ChatManager:
             await self.active_connections[client_id].close(
                 code=status.WS_1011_INTERNAL_ERROR, reason=str(e)[:120]
             )
-            self.disconnect(client_id)
+            await self.disconnect(client_id)
         finally:
             try:
                 connection = self.active_connections.get(client_id)
                 if connection:
                     await connection.close(code=1000, reason="Client disconnected")
-                    self.disconnect(client_id)
+                    await self.disconnect(client_id)
             except Exception as e:
                 logger.exception(e)
-            self.disconnect(client_id)
+            await self.disconnect(client_id)
 
 
 async def process_graph(
@@ -196,10 +328,15 @@ async def process_graph(
     is_first_message: bool,
     chat_message: ChatMessage,
     websocket: WebSocket,
+    load_history: Optional[Callable[[], Awaitable[List[ChatMessage]]]] = None,
 ):
-    langchain_object = load_or_build_langchain_object(graph_data, is_first_message)
+    langchain_object = await aload_or_build_langchain_object(
+        graph_data, is_first_message
+    )
     langchain_object = try_setting_streaming_options(langchain_object, websocket)
     logger.debug("Loaded langchain object")
+    if load_history is not None:
+        await restore_memory(langchain_object, load_history)
 
     if langchain_object is None:
         # Raise user facing error
@@ -219,3 +356,26 @@ async def process_graph(
         # Log stack trace
         logger.exception(e)
         raise e
+
+
+async def restore_memory(
+    langchain_object: Any, load_history: Callable[[], Awaitable[List[ChatMessage]]]
+):
+    """
+    Fill the empty memory of a chain with the history of the session, e.g.
+    when the client resumes its session on another worker.
+    """
+    chat_memory = getattr(
+        getattr(langchain_object, "memory", None), "chat_memory", None
+    )
+    if chat_memory is None or chat_memory.messages:
+        return
+    history = await load_history()
+    # The last message is the question that is being answered
+    for message in history[:-1]:
+        if message.message is None:
+            continue
+        if not message.is_bot:
+            chat_memory.add_user_message(message.message)
+        elif message.type == "end":
+            chat_memory.add_ai_message(message.message)
@@ -3,13 +3,16 @@ from importlib.metadata import version
 
 from fastapi import APIRouter, HTTPException
 
+from langflow.api.base import CacheResponse, ExecutorResponse
 from langflow.api.schemas import (
     ExportedFlow,
     GraphData,
     PredictRequest,
     PredictResponse,
 )
-from langflow.interface.run import process_graph_cached
+from langflow.cache.lru import get_cache_stats
+from langflow.interface.executor import ExecutorBusyError, get_chain_executor
+from langflow.interface.run import aprocess_graph_cached
 from langflow.interface.types import build_langchain_types_dict
 
 # build router
@@ -28,8 +31,10 @@ async def get_load(predict_request: PredictRequest):
         exported_flow: ExportedFlow = predict_request.exported_flow
         graph_data: GraphData = exported_flow.data
         data = graph_data.dict()
-        response = process_graph_cached(data, predict_request.message)
+        response = await aprocess_graph_cached(data, predict_request.message)
         return PredictResponse(result=response.get("result", ""))
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         # Log stack trace
         logger.exception(e)
@@ -42,6 +47,18 @@ def get_version():
     return {"version": version("langflow")}
 
 
+@router.get("/cache/stats", response_model=CacheResponse)
+def get_cache_statistics():
+    """Hits, misses, evictions and size of the caches."""
+    return CacheResponse(data=get_cache_stats())
+
+
+@router.get("/executor/stats", response_model=ExecutorResponse)
+def get_executor_statistics():
+    """Running and queued calls of the chains that run synchronously."""
+    return ExecutorResponse(data=get_chain_executor().stats())
+
+
 @router.get("/health")
 def get_health():
     return {"status": "OK"}
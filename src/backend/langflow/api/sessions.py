@@ -0,0 +1,493 @@
+# Description: Stores of the chat sessions, their history and metadata
+# Insights:
+#   - The in-memory store keeps the sessions of one worker only
+#   - The SQLite store is shared by the workers of a host, so a client that
+#     reconnects to another worker resumes its session
+#   - The history of a session is bounded by messages and bytes, the
+#     oldest messages are dropped first
+#   - The shared store keeps the messages as JSON, a file in the database
+#     is already encoded as base64 or CSV when its message is added
+
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from langflow.api.schemas import ChatMessage, ChatResponse, FileResponse
+from langflow.cache.backends import create_private_file, get_cache_dir
+from langflow.cache.lru import estimate_size
+from langflow.settings import settings
+from langflow.utils.logger import logger
+
+# Messages that are not shown to the user again
+HIDDEN_MESSAGE_TYPES = {"start", "stream"}
+# Messages that start the answer to a question
+TURN_START_TYPES = {"start", "human"}
+
+MESSAGE_CLASSES = {
+    message_class.__name__: message_class
+    for message_class in [ChatMessage, ChatResponse, FileResponse]
+}
+
+
+def dump_message(message: ChatMessage) -> str:
+    # Values that are not JSON, e.g. custom objects of a tool, are kept as text
+    return json.dumps(
+        {"class": type(message).__name__, "message": message.dict()}, default=repr
+    )
+
+
+def load_message(data: str) -> ChatMessage:
+    content = json.loads(data)
+    if content["class"] not in MESSAGE_CLASSES:
+        raise ValueError(f"Unknown message class {content['class']}")
+    return MESSAGE_CLASSES[content["class"]](**content["message"])
+
+
+def estimate_message_size(message: ChatMessage) -> int:
+    """Estimate the bytes held by a message, files included."""
+    size = len(message.message or "") + len(getattr(message, "intermediate_steps", ""))
+    data = getattr(message, "data", None)
+    if data is None:
+        return size
+    if isinstance(data, (str, bytes)):
+        return size + len(data)
+    if hasattr(data, "memory_usage"):
+        # pandas DataFrame
+        return size + int(data.memory_usage(deep=True).sum())
+    if hasattr(data, "getbands"):
+        # PIL Image
+        return size + data.width * data.height * len(data.getbands())
+    return size + estimate_size(data)
+
+
+class SessionStore(ABC):
+    """
+    Stores the history and the metadata of the chat sessions by client.
+    The history is bounded by the chat_history_max_messages and
+    chat_history_max_bytes settings.
+    """
+
+    # Whether the calls wait for I/O, so they must not run on the event loop
+    blocking = False
+
+    @abstractmethod
+    def add_message(self, client_id: str, message: ChatMessage) -> None:
+        pass
+
+    @abstractmethod
+    def get_messages(self, client_id: str, filter: bool = True) -> List[ChatMessage]:
+        """Get the messages of a session, without the hidden ones if filter."""
+
+    @abstractmethod
+    def get_page(
+        self, client_id: str, offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[ChatMessage], int]:
+        """
+        Get the shown messages before the offset most recent ones, at most
+        limit of them and oldest first, and the number of shown messages.
+        """
+
+    @abstractmethod
+    def count_messages(self, client_id: str) -> int:
+        """Count the messages of a session that are shown."""
+
+    @abstractmethod
+    def get_last_message(self, client_id: str) -> Optional[ChatMessage]:
+        pass
+
+    @abstractmethod
+    def get_last_turn(self, client_id: str) -> List[ChatMessage]:
+        """Get the messages after the last question or start of an answer."""
+
+    @abstractmethod
+    def touch(self, client_id: str) -> None:
+        """Mark a session as active."""
+
+    @abstractmethod
+    def clear(self, client_id: str) -> None:
+        """Remove the history and the metadata of a session."""
+
+    @abstractmethod
+    def get_metadata(self, client_id: str) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def update_metadata(self, client_id: str, **values: Any) -> None:
+        pass
+
+    @abstractmethod
+    def get_idle_sessions(self, max_idle: float) -> List[str]:
+        """Get the clients whose session was not active for max_idle seconds."""
+
+    def evict_idle(self, max_idle: Optional[float], active: Iterable[str] = ()):
+        """Remove the sessions that are idle, but the active ones."""
+        if max_idle is None:
+            return
+        active = set(active)
+        for client_id in self.get_idle_sessions(max_idle):
+            if client_id not in active:
+                logger.debug(f"Removing the idle chat session of {client_id}")
+                self.clear(client_id)
+
+
+class ClientHistory:
+    """
+    Messages of a client, the oldest are dropped beyond max_messages or
+    max_bytes. The messages shown to the user, without the start and
+    stream ones, are kept in a second view as they are added.
+    """
+
+    def __init__(self, max_messages: int, max_bytes: Optional[int]):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.messages: Deque[Tuple[ChatMessage, int]] = deque()
+        self.filtered: Deque[ChatMessage] = deque()
+        self.bytes = 0
+        self.metadata: Dict[str, Any] = {}
+        self.last_active = time.time()
+
+    def add(self, message: ChatMessage) -> None:
+        size = estimate_message_size(message)
+        self.messages.append((message, size))
+        self.bytes += size
+        if message.type not in HIDDEN_MESSAGE_TYPES:
+            self.filtered.append(message)
+        while len(self.messages) > self.max_messages or (
+            self.max_bytes is not None
+            and self.bytes > self.max_bytes
+            and len(self.messages) > 1
+        ):
+            oldest, oldest_size = self.messages.popleft()
+            self.bytes -= oldest_size
+            if self.filtered and self.filtered[0] is oldest:
+                self.filtered.popleft()
+        self.touch()
+
+    def touch(self) -> None:
+        self.last_active = time.time()
+
+    def get_messages(self, filter: bool = True) -> List[ChatMessage]:
+        if filter:
+            return list(self.filtered)
+        return [message for message, _ in self.messages]
+
+    def get_page(
+        self, offset: int = 0, limit: Optional[int] = None
+    ) -> List[ChatMessage]:
+        end = len(self.filtered) - offset
+        start = 0 if limit is None else max(end - limit, 0)
+        return list(itertools.islice(self.filtered, start, max(end, 0)))
+
+    def get_last_turn(self) -> List[ChatMessage]:
+        turn: List[ChatMessage] = []
+        for message, _ in reversed(self.messages):
+            if message.type in TURN_START_TYPES:
+                break
+            turn.append(message)
+        return turn[::-1]
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions of the current worker only."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.sessions: Dict[str, ClientHistory] = {}
+
+    def _get_session(self, client_id: str) -> ClientHistory:
+        if client_id not in self.sessions:
+            self.sessions[client_id] = ClientHistory(
+                max_messages=settings.chat_history_max_messages,
+                max_bytes=settings.chat_history_max_bytes,
+            )
+        return self.sessions[client_id]
+
+    def add_message(self, client_id: str, message: ChatMessage) -> None:
+        with self._lock:
+            self._get_session(client_id).add(message)
+
+    def get_messages(self, client_id: str, filter: bool = True) -> List[ChatMessage]:
+        with self._lock:
+            if client_id not in self.sessions:
+                return []
+            session = self.sessions[client_id]
+            session.touch()
+            return session.get_messages(filter)
+
+    def get_page(
+        self, client_id: str, offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[ChatMessage], int]:
+        with self._lock:
+            if client_id not in self.sessions:
+                return [], 0
+            session = self.sessions[client_id]
+            session.touch()
+            return session.get_page(offset, limit), len(session.filtered)
+
+    def count_messages(self, client_id: str) -> int:
+        with self._lock:
+            if client_id not in self.sessions:
+                return 0
+            return len(self.sessions[client_id].filtered)
+
+    def get_last_message(self, client_id: str) -> Optional[ChatMessage]:
+        with self._lock:
+            if client_id not in self.sessions:
+                return None
+            messages = self.sessions[client_id].messages
+            return messages[-1][0] if messages else None
+
+    def get_last_turn(self, client_id: str) -> List[ChatMessage]:
+        with self._lock:
+            if client_id not in self.sessions:
+                return []
+            return self.sessions[client_id].get_last_turn()
+
+    def touch(self, client_id: str) -> None:
+        with self._lock:
+            self._get_session(client_id).touch()
+
+    def clear(self, client_id: str) -> None:
+        with self._lock:
+            self.sessions.pop(client_id, None)
+
+    def get_metadata(self, client_id: str) -> Dict[str, Any]:
+        with self._lock:
+            if client_id not in self.sessions:
+                return {}
+            return dict(self.sessions[client_id].metadata)
+
+    def update_metadata(self, client_id: str, **values: Any) -> None:
+        with self._lock:
+            self._get_session(client_id).metadata.update(values)
+
+    def get_idle_sessions(self, max_idle: float) -> List[str]:
+        oldest_active = time.time() - max_idle
+        with self._lock:
+            return [
+                client_id
+                for client_id, session in self.sessions.items()
+                if session.last_active < oldest_active
+            ]
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite database shared by the workers."""
+
+    blocking = True
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # The journals of SQLite get the permissions of the database
+        create_private_file(self.path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._connection:
+            # WAL lets the workers read while one of them writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (client_id TEXT PRIMARY KEY, "
+                "last_active REAL NOT NULL, metadata TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT NOT NULL, "
+                "type TEXT NOT NULL, hidden INTEGER NOT NULL, size INTEGER NOT NULL, "
+                "data TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_client_id "
+                "ON messages (client_id, id)"
+            )
+
+    def _touch(self, client_id: str) -> None:
+        # Called with the lock held, in a transaction
+        self._connection.execute(
+            "INSERT INTO sessions (client_id, last_active, metadata) "
+            "VALUES (?, ?, '{}') "
+            "ON CONFLICT (client_id) DO UPDATE SET last_active = excluded.last_active",
+            (client_id, time.time()),
+        )
+
+    def add_message(self, client_id: str, message: ChatMessage) -> None:
+        data = dump_message(message)
+        hidden = message.type in HIDDEN_MESSAGE_TYPES
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO messages (client_id, type, hidden, size, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (client_id, message.type, hidden, estimate_message_size(message), data),
+            )
+            self._touch(client_id)
+            self._trim(client_id)
+
+    def _trim(self, client_id: str) -> None:
+        max_messages = settings.chat_history_max_messages
+        # Only the newest messages that can be kept, and the one after them,
+        # are read. The newest message is always kept
+        row = self._connection.execute(
+            "SELECT id FROM ("
+            "SELECT id, ROW_NUMBER() OVER newest AS position, "
+            "SUM(size) OVER newest AS kept_bytes FROM ("
+            "SELECT id, size FROM messages WHERE client_id = ? "
+            "ORDER BY id DESC LIMIT ?"
+            ") WINDOW newest AS (ORDER BY id DESC)"
+            ") WHERE position > 1 AND (position > ? OR kept_bytes > ?) "
+            "ORDER BY id DESC LIMIT 1",
+            (
+                client_id,
+                max(max_messages, 1) + 1,
+                max_messages,
+                settings.chat_history_max_bytes,
+            ),
+        ).fetchone()
+        if row is not None:
+            # This message and the older ones are dropped
+            self._connection.execute(
+                "DELETE FROM messages WHERE client_id = ? AND id <= ?",
+                (client_id, row[0]),
+            )
+
+    def get_messages(self, client_id: str, filter: bool = True) -> List[ChatMessage]:
+        query = "SELECT data FROM messages WHERE client_id = ?"
+        if filter:
+            query += " AND hidden = 0"
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                f"{query} ORDER BY id", (client_id,)
+            ).fetchall()
+            if rows:
+                self._touch(client_id)
+        return [load_message(row[0]) for row in rows]
+
+    def get_page(
+        self, client_id: str, offset: int = 0, limit: Optional[int] = None
+    ) -> Tuple[List[ChatMessage], int]:
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT data FROM messages WHERE client_id = ? AND hidden = 0 "
+                "ORDER BY id DESC LIMIT ? OFFSET ?",
+                (client_id, -1 if limit is None else limit, offset),
+            ).fetchall()
+            (total,) = self._connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE client_id = ? AND hidden = 0",
+                (client_id,),
+            ).fetchone()
+            if total:
+                self._touch(client_id)
+        return [load_message(row[0]) for row in reversed(rows)], total
+
+    def count_messages(self, client_id: str) -> int:
+        with self._lock, self._connection:
+            (total,) = self._connection.execute(
+                "SELECT COUNT(*) FROM messages WHERE client_id = ? AND hidden = 0",
+                (client_id,),
+            ).fetchone()
+        return total
+
+    def get_last_message(self, client_id: str) -> Optional[ChatMessage]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT data FROM messages WHERE client_id = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (client_id,),
+            ).fetchone()
+        return load_message(row[0]) if row else None
+
+    def get_last_turn(self, client_id: str) -> List[ChatMessage]:
+        turn_types = ", ".join("?" * len(TURN_START_TYPES))
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT data FROM messages WHERE client_id = ? AND id > "
+                "(SELECT COALESCE(MAX(id), 0) FROM messages "
+                f"WHERE client_id = ? AND type IN ({turn_types})) ORDER BY id",
+                (client_id, client_id, *TURN_START_TYPES),
+            ).fetchall()
+        return [load_message(row[0]) for row in rows]
+
+    def touch(self, client_id: str) -> None:
+        with self._lock, self._connection:
+            self._touch(client_id)
+
+    def clear(self, client_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE client_id = ?", (client_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM sessions WHERE client_id = ?", (client_id,)
+            )
+
+    def get_metadata(self, client_id: str) -> Dict[str, Any]:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT metadata FROM sessions WHERE client_id = ?", (client_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update_metadata(self, client_id: str, **values: Any) -> None:
+        with self._lock, self._connection:
+            self._touch(client_id)
+            (metadata,) = self._connection.execute(
+                "SELECT metadata FROM sessions WHERE client_id = ?", (client_id,)
+            ).fetchone()
+            metadata = {**json.loads(metadata), **values}
+            self._connection.execute(
+                "UPDATE sessions SET metadata = ? WHERE client_id = ?",
+                (json.dumps(metadata, default=repr), client_id),
+            )
+
+    def get_idle_sessions(self, max_idle: float) -> List[str]:
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                "SELECT client_id FROM sessions WHERE last_active < ?",
+                (time.time() - max_idle,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+SESSION_STORES = {
+    "memory": InMemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+}
+
+SESSIONS_DB = "sessions.db"
+
+
+def create_session_store(name: str) -> SessionStore:
+    if name not in SESSION_STORES:
+        raise ValueError(
+            f"Unknown session store {name}, "
+            f"it should be one of {list(SESSION_STORES)}"
+        )
+    if name == "sqlite":
+        return SQLiteSessionStore(get_cache_dir() / SESSIONS_DB)
+    return InMemorySessionStore()
+
+
+_store: Optional[Tuple[Tuple, SessionStore]] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    Get the store of the kind selected by the session_store setting.
+
+    It is created on first use in each process, a forked worker must not
+    share the connection of its parent, and again when the settings change.
+    """
+    global _store
+    current = (os.getpid(), settings.session_store, settings.cache_dir)
+    with _store_lock:
+        if _store is None or _store[0] != current:
+            _store = (current, create_session_store(settings.session_store))
+        return _store[1]
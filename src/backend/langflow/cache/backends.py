@@ -0,0 +1,236 @@
+# Description: Backends for the build artifacts shared between workers
+# Insights:
+#   - Only serializable artifacts are stored: plans, documents, embeddings
+#   - The filesystem and SQLite backends are shared by every worker of a host
+#   - A failing backend is a cache miss, never a failed build
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import dill  # type: ignore
+
+from langflow.cache.disk import DiskCache
+from langflow.cache.lru import LRUCache, register_cache
+from langflow.settings import settings
+from langflow.utils.logger import logger
+
+ARTIFACTS_FOLDER = "artifacts"
+
+
+def create_private_file(path: Path) -> None:
+    """Create a file only its owner can read, e.g. a database of the workers."""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+    # A file created before keeps the permissions of the umask
+    os.chmod(path, 0o600)
+
+
+class CacheBackend(ABC):
+    """Stores serializable artifacts by key."""
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        try:
+            data = self._get_bytes(key)
+        except Exception as exc:
+            logger.debug(f"Error reading {key} from the cache: {exc}")
+            return default
+        if data is None:
+            return default
+        try:
+            return dill.loads(data)
+        except Exception as exc:
+            logger.debug(f"Error loading {key} from the cache: {exc}")
+            self.delete(key)
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self._set_bytes(key, dill.dumps(value))
+        except Exception as exc:
+            logger.debug(f"Error writing {key} to the cache: {exc}")
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            return self._contains(key)
+        except Exception:
+            return False
+
+    @abstractmethod
+    def _get_bytes(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def _set_bytes(self, key: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def _contains(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Artifacts of the current process only."""
+
+    def __init__(self, namespace: str = "artifacts", maxsize: Optional[int] = None):
+        if maxsize is None:
+            maxsize = settings.memory_cache_size
+        # A new backend of a namespace replaces the previous one
+        self._cache = register_cache(
+            f"backend:{namespace}", LRUCache(maxsize=maxsize), replace=True
+        )
+
+    def _get_bytes(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def _set_bytes(self, key: str, data: bytes) -> None:
+        self._cache.set(key, data)
+
+    def _contains(self, key: str) -> bool:
+        return key in self._cache
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+class FileSystemCacheBackend(CacheBackend):
+    """Artifacts in a disk cache in a folder shared by the workers."""
+
+    def __init__(self, directory: Path):
+        self._disk_cache = DiskCache(
+            directory,
+            compression=settings.disk_cache_compression,
+            max_bytes=settings.disk_cache_max_bytes,
+            max_age=settings.disk_cache_max_age,
+        )
+
+    def _get_bytes(self, key: str) -> Optional[bytes]:
+        return self._disk_cache.get_raw(key)
+
+    def _set_bytes(self, key: str, data: bytes) -> None:
+        # Already serialized, the disk cache only compresses it
+        self._disk_cache.set_raw(key, data)
+
+    def _contains(self, key: str) -> bool:
+        return key in self._disk_cache
+
+    def delete(self, key: str) -> None:
+        self._disk_cache.delete(key)
+
+    def clear(self) -> None:
+        self._disk_cache.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Artifacts in a SQLite database shared by the workers."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # The journals of SQLite get the permissions of the database
+        create_private_file(self.path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            str(self.path), check_same_thread=False, timeout=30
+        )
+        with self._lock, self._connection:
+            # WAL lets the workers read while one of them writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _execute(self, query: str, params: Tuple = ()) -> sqlite3.Cursor:
+        with self._lock, self._connection:
+            return self._connection.execute(query, params)
+
+    def _get_bytes(self, key: str) -> Optional[bytes]:
+        row = self._execute(
+            "SELECT value FROM artifacts WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_bytes(self, key: str, data: bytes) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO artifacts (key, value, created_at) "
+            "VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(data), time.time()),
+        )
+
+    def _contains(self, key: str) -> bool:
+        row = self._execute("SELECT 1 FROM artifacts WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def delete(self, key: str) -> None:
+        self._execute("DELETE FROM artifacts WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._execute("DELETE FROM artifacts")
+
+
+CACHE_BACKENDS = {
+    "memory": InMemoryCacheBackend,
+    "filesystem": FileSystemCacheBackend,
+    "sqlite": SQLiteCacheBackend,
+}
+
+_backends: Dict[str, Tuple[Tuple, CacheBackend]] = {}
+_backends_lock = threading.Lock()
+
+
+def get_cache_dir() -> Path:
+    if settings.cache_dir:
+        return Path(settings.cache_dir)
+    # Imported here to avoid circular imports
+    from langflow.cache.base import PREFIX
+
+    return Path(tempfile.gettempdir()) / PREFIX / ARTIFACTS_FOLDER
+
+
+def create_cache_backend(name: str, namespace: str = "artifacts") -> CacheBackend:
+    """Create a backend, the namespace keeps its artifacts apart from others."""
+    if name not in CACHE_BACKENDS:
+        raise ValueError(
+            f"Unknown cache backend {name}, "
+            f"it should be one of {list(CACHE_BACKENDS)}"
+        )
+    if name == "filesystem":
+        return FileSystemCacheBackend(get_cache_dir() / namespace)
+    if name == "sqlite":
+        return SQLiteCacheBackend(get_cache_dir() / f"{namespace}.db")
+    return InMemoryCacheBackend(namespace)
+
+
+def get_cache_backend(
+    namespace: str = "artifacts", name: Optional[str] = None
+) -> CacheBackend:
+    """
+    Get the cache backend of a namespace. The backend is the one
+    selected by the cache_backend setting unless a name is given.
+    """
+    name = name or settings.cache_backend
+    current_settings = (name, settings.cache_dir, settings.memory_cache_size)
+    with _backends_lock:
+        if namespace in _backends:
+            backend_settings, backend = _backends[namespace]
+            if backend_settings == current_settings:
+                return backend
+        backend = create_cache_backend(name, namespace)
+        _backends[namespace] = (current_settings, backend)
+        return backend
@@ -1,15 +1,18 @@
-import base64
-import contextlib
+import asyncio
 import functools
 import hashlib
 import json
 import os
 import tempfile
-from collections import OrderedDict
+import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
 
-import dill  # type: ignore
+from langflow.cache.blobs import BLOBS_FOLDER, BlobStore
+from langflow.cache.disk import DiskCache
+from langflow.cache.lru import LRUCache, register_cache
+from langflow.settings import settings
 
 CACHE: Dict[str, Any] = {}
 
@@ -27,27 +30,68 @@ def create_cache_folder(func):
     return wrapper
 
 
-def memoize_dict(maxsize=128):
-    cache = OrderedDict()
+def _current(value: Any) -> Any:
+    return value() if callable(value) else value
+
+
+def memoize_dict(
+    maxsize: Union[int, Callable[[], int]] = 128,
+    ttl: Union[Optional[float], Callable[[], Optional[float]]] = None,
+    max_weight: Union[Optional[int], Callable[[], Optional[int]]] = None,
+    namespace: Optional[Callable[[], Hashable]] = None,
+):
+    """
+    Memoize a function whose first argument is a flow, by the hash of the flow.
+
+    The results are kept in an LRUCache bounded by maxsize items and
+    optionally by age (ttl) and estimated size in bytes (max_weight).
+    The bounds can also be functions, e.g. reading the settings, that are
+    called again on each call.
+    Concurrent calls with the same flow share a single computation.
+    If namespace is set, the key also includes what it returns when
+    called, e.g. the current client, and each namespace can be
+    invalidated on its own.
+    """
 
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
+        cache = register_cache(func.__name__, LRUCache())
+
+        def get_cache() -> LRUCache:
+            cache.configure(_current(maxsize), _current(ttl), _current(max_weight))
+            return cache
+
+        def get_key(args, kwargs):
             hashed = compute_dict_hash(args[0])
-            key = (func.__name__, hashed, frozenset(kwargs.items()))
-            if key not in cache:
-                result = func(*args, **kwargs)
-                cache[key] = result
-                if len(cache) > maxsize:
-                    cache.popitem(last=False)
-            else:
-                result = cache[key]
-            return result
+            current_namespace = namespace() if namespace is not None else None
+            return (func.__name__, current_namespace, hashed, frozenset(kwargs.items()))
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            key = get_key(args, kwargs)
+            return get_cache().get_or_set(key, lambda: func(*args, **kwargs))
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key = get_key(args, kwargs)
+            return await get_cache().aget_or_set(key, lambda: func(*args, **kwargs))
+
+        wrapper = async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
 
         def clear_cache():
             cache.clear()
 
+        def invalidate(*args, **kwargs):
+            """Remove the result of a call in the current namespace."""
+            cache.delete(get_key(args, kwargs))
+
+        def clear_namespace(cleared_namespace: Hashable):
+            for key in cache.keys():
+                if key[1] == cleared_namespace:
+                    cache.delete(key)
+
         wrapper.clear_cache = clear_cache  # type: ignore
+        wrapper.invalidate = invalidate  # type: ignore
+        wrapper.clear_namespace = clear_namespace  # type: ignore
         wrapper.cache = cache  # type: ignore
         return wrapper
 
@@ -57,60 +101,177 @@ def memoize_dict(maxsize=128):
 PREFIX = "langflow_cache"
 
 
-@create_cache_folder
-def clear_old_cache_files(max_cache_size: int = 3):
-    cache_dir = Path(tempfile.gettempdir()) / PREFIX
-    cache_files = list(cache_dir.glob("*.dill"))
+# Folder of the dill cache, inside the cache folder
+DILL_CACHE_FOLDER = "dill"
+
+_disk_cache: Optional[DiskCache] = None
 
-    if len(cache_files) > max_cache_size:
-        cache_files_sorted_by_mtime = sorted(
-            cache_files, key=lambda x: x.stat().st_mtime, reverse=True
+
+def get_disk_cache() -> DiskCache:
+    """Get the disk cache of the objects saved with save_cache."""
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = DiskCache(
+            Path(tempfile.gettempdir()) / PREFIX / DILL_CACHE_FOLDER,
+            compression=settings.disk_cache_compression,
+            max_bytes=settings.disk_cache_max_bytes,
+            max_age=settings.disk_cache_max_age,
         )
+    return _disk_cache
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Get the store of the files uploaded to the nodes."""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore(Path(tempfile.gettempdir()) / PREFIX / BLOBS_FOLDER)
+    return _blob_store
+
+
+def clear_old_cache_files():
+    """Evict the cached files that are too old or exceed the size budget."""
+    global _cleared_at
+    _cleared_at = time.monotonic()
+    get_disk_cache().evict()
+    get_blob_store().prune(settings.disk_cache_max_age)
+
+
+# Seconds between two cleanups of the cached files, at most
+CLEANUP_INTERVAL = 10 * 60
 
-        for cache_file in cache_files_sorted_by_mtime[max_cache_size:]:
-            with contextlib.suppress(OSError):
-                os.remove(cache_file)
+_cleared_at = time.monotonic()
+
+
+def clear_old_cache_files_periodically():
+    """Clear the old cached files if it was not done in the last interval."""
+    if time.monotonic() - _cleared_at >= CLEANUP_INTERVAL:
+        clear_old_cache_files()
+
+
+# The last flow hashed in the current request and its hash. It lives in
+# the context of the request, so it is released with the request
+LAST_GRAPH_HASH: ContextVar[Optional[Tuple[Dict, str]]] = ContextVar(
+    "last_graph_hash", default=None
+)
+
+
+# The last file contents hashed in the current request and their digests.
+# The same content is hashed with the flow and again when it is saved
+LAST_CONTENT_DIGESTS: ContextVar[Tuple[Tuple[str, str], ...]] = ContextVar(
+    "last_content_digests", default=()
+)
+MAX_LAST_CONTENT_DIGESTS = 8
+
+
+def get_content_digest(content: str) -> str:
+    """Get the SHA-256 digest of the content of a file, its address in the stores."""
+    memoized = LAST_CONTENT_DIGESTS.get()
+    for hashed_content, digest in memoized:
+        if hashed_content is content:
+            return digest
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    LAST_CONTENT_DIGESTS.set(
+        ((content, digest),) + memoized[: MAX_LAST_CONTENT_DIGESTS - 1]
+    )
+    return digest
 
 
 def compute_dict_hash(graph_data):
-    graph_data = filter_json(graph_data)
+    # The same request is usually hashed more than once
+    memoized = LAST_GRAPH_HASH.get()
+    if memoized is not None and memoized[0] is graph_data:
+        return memoized[1]
 
-    cleaned_graph_json = json.dumps(graph_data, sort_keys=True)
-    return hashlib.sha256(cleaned_graph_json.encode("utf-8")).hexdigest()
+    cleaned_graph_json = json.dumps(normalize_flow(graph_data), sort_keys=True)
+    computed_hash = hashlib.sha256(cleaned_graph_json.encode("utf-8")).hexdigest()
+    LAST_GRAPH_HASH.set((graph_data, computed_hash))
+    return computed_hash
 
 
-def filter_json(json_data):
-    filtered_data = json_data.copy()
+# Keys that don't change what is built
+FILTERED_FLOW_KEYS = {"viewport", "chatHistory"}
+FILTERED_NODE_KEYS = {"position", "positionAbsolute", "selected", "dragging"}
+
+# The only fields of a flow that are used to build it
+BUILD_TEMPLATE_FIELDS = ["type", "required", "list", "value", "suffixes"]
 
-    # Remove 'viewport' and 'chatHistory' keys
-    if "viewport" in filtered_data:
-        del filtered_data["viewport"]
-    if "chatHistory" in filtered_data:
-        del filtered_data["chatHistory"]
+
+def filter_json(json_data):
+    """Copy the flow without the keys that are only used by the frontend."""
+    filtered_data = {
+        key: value for key, value in json_data.items() if key not in FILTERED_FLOW_KEYS
+    }
 
     # Filter nodes
     if "nodes" in filtered_data:
-        for node in filtered_data["nodes"]:
-            if "position" in node:
-                del node["position"]
-            if "positionAbsolute" in node:
-                del node["positionAbsolute"]
-            if "selected" in node:
-                del node["selected"]
-            if "dragging" in node:
-                del node["dragging"]
+        filtered_data["nodes"] = [
+            {key: value for key, value in node.items() if key not in FILTERED_NODE_KEYS}
+            for node in filtered_data["nodes"]
+        ]
 
     return filtered_data
 
 
-@create_cache_folder
-def save_binary_file(content: str, file_name: str, accepted_types: list[str]) -> str:
+def _normalize_template_field(field: Any) -> Any:
+    if not isinstance(field, dict):
+        return field
+    normalized = {key: field[key] for key in BUILD_TEMPLATE_FIELDS if key in field}
+    if field.get("type") == "file" and isinstance(field.get("content"), str):
+        # The digest stands for the content, which can be very large
+        normalized["content"] = {"digest": get_content_digest(field["content"])}
+    return normalized
+
+
+def _normalize_node(node: Dict) -> Dict:
+    data = node.get("data", {})
+    node_data = data.get("node", {})
+    return {
+        "id": node.get("id"),
+        "type": data.get("type"),
+        "base_classes": node_data.get("base_classes"),
+        "template": {
+            key: _normalize_template_field(field)
+            for key, field in node_data.get("template", {}).items()
+        },
+    }
+
+
+def normalize_flow(graph_data: Dict) -> Dict:
     """
-    Save a binary file to the specified folder.
+    Keep only what is used to build a flow: the node types, their values
+    and the wiring.
+
+    Names, descriptions, visibility and layout don't change the result,
+    so two flows that only differ in them are normalized to the same dict.
+    The order of the nodes is kept, the root of the flow depends on it.
+    The flow is not modified.
+    """
+    return {
+        "nodes": [_normalize_node(node) for node in graph_data.get("nodes", [])],
+        # The order of the edges is kept: it sets the order of list params
+        "edges": [
+            {"source": edge.get("source"), "target": edge.get("target")}
+            for edge in graph_data.get("edges", [])
+        ],
+    }
+
+
+def save_binary_file(
+    content: str,
+    file_name: str,
+    accepted_types: list[str],
+    digest: Optional[str] = None,
+) -> str:
+    """
+    Save a binary file to the blob store, unless it is stored already.
 
     Args:
-        content: The content of the file as a bytes object.
+        content: The content of the file as a data URL.
         file_name: The name of the file, including its extension.
+        digest: The digest of the content, computed if not given.
 
     Returns:
         The path to the saved file.
@@ -118,37 +279,22 @@ def save_binary_file(content: str, file_name: str, accepted_types: list[str]) ->
     if not any(file_name.endswith(suffix) for suffix in accepted_types):
         raise ValueError(f"File {file_name} is not accepted")
 
-    # Get the destination folder
-    cache_path = Path(tempfile.gettempdir()) / PREFIX
     if content is None:
         raise ValueError("Please, reload the file in the loader.")
-    data = content.split(",")[1]
-    decoded_bytes = base64.b64decode(data)
-
-    # Create the full file path
-    file_path = os.path.join(cache_path, file_name)
-
-    # Save the binary content to the file
-    with open(file_path, "wb") as file:
-        file.write(decoded_bytes)
-
-    return file_path
+    # A stored file is not decoded again
+    if digest is None:
+        digest = get_content_digest(content)
+    return str(get_blob_store().put(digest, file_name, content))
 
 
-@create_cache_folder
 def save_cache(hash_val: str, chat_data, clean_old_cache_files: bool):
-    cache_path = Path(tempfile.gettempdir()) / PREFIX / f"{hash_val}.dill"
-    with cache_path.open("wb") as cache_file:
-        dill.dump(chat_data, cache_file)
+    # Saving evicts files already, clean_old_cache_files forces it
+    # to also remove the files that are too old
+    get_disk_cache().set(hash_val, chat_data)
 
     if clean_old_cache_files:
         clear_old_cache_files()
 
 
-@create_cache_folder
 def load_cache(hash_val):
-    cache_path = Path(tempfile.gettempdir()) / PREFIX / f"{hash_val}.dill"
-    if cache_path.exists():
-        with cache_path.open("rb") as cache_file:
-            return dill.load(cache_file)
-    return None
+    return get_disk_cache().get(hash_val)
@@ -0,0 +1,120 @@
+# Description: Content-addressed store of the files uploaded to the nodes
+# Insights:
+#   - Files are stored by the digest of their content, so two uploads with
+#     the same name never overwrite each other
+#   - A file that is already stored is not decoded nor written again
+#   - The same content uploaded with another name is linked, not copied
+#   - Only the owner can read the files, as in the other on-disk caches
+
+import base64
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from langflow.utils.logger import logger
+
+BLOBS_FOLDER = "blobs"
+
+
+class BlobStore:
+    """
+    Files by content digest, in <digest[:2]>/<digest>/<file name>.
+
+    Nodes hold a reference to the files they use. Files that nobody in
+    this process references can be removed with prune once they have not
+    been used for a while, since other workers may still use them.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._references: Dict[str, int] = {}
+
+    def _get_blob_dir(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def get_path(self, digest: str, file_name: str) -> Path:
+        # Only the name of the file, it must not point outside of the store
+        return self._get_blob_dir(digest) / Path(file_name).name
+
+    def exists(self, digest: str, file_name: str) -> bool:
+        return self.get_path(digest, file_name).exists()
+
+    def put(self, digest: str, file_name: str, data_url: str) -> Path:
+        """Store the content of a data URL, unless it is stored already."""
+        path = self.get_path(digest, file_name)
+        if path.exists():
+            return path
+        # Every folder of the store, not only the last one, is private
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        for folder in [path.parent.parent, path.parent]:
+            folder.mkdir(mode=0o700, exist_ok=True)
+        existing = next(
+            (other for other in path.parent.iterdir() if other.suffix != ".tmp"),
+            None,
+        )
+        if existing is not None:
+            # Same content, another name
+            self._link(existing, path)
+        else:
+            data = data_url.split(",")[1]
+            self._write_atomically(path, base64.b64decode(data))
+        return path
+
+    @staticmethod
+    def _link(source: Path, path: Path) -> None:
+        try:
+            os.link(source, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copyfile(source, path)
+
+    @staticmethod
+    def _write_atomically(path: Path, data: bytes) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    def acquire(self, digest: str) -> None:
+        """Hold a reference to a file, so that it is not pruned."""
+        with self._lock:
+            self._references[digest] = self._references.get(digest, 0) + 1
+        # The modification time of the folder is the last time it was used
+        with contextlib.suppress(OSError):
+            os.utime(self._get_blob_dir(digest))
+
+    def release(self, digest: str) -> None:
+        with self._lock:
+            count = self._references.get(digest, 0) - 1
+            if count > 0:
+                self._references[digest] = count
+            else:
+                self._references.pop(digest, None)
+
+    def reference_count(self, digest: str) -> int:
+        return self._references.get(digest, 0)
+
+    def prune(self, max_age: Optional[float]) -> None:
+        """Remove the files that are not referenced and were not used lately."""
+        if max_age is None or not self.directory.exists():
+            return
+        oldest_mtime = time.time() - max_age
+        for blob_dir in self.directory.glob("*/*"):
+            if self.reference_count(blob_dir.name) > 0:
+                continue
+            with contextlib.suppress(OSError):
+                if blob_dir.stat().st_mtime < oldest_mtime:
+                    logger.debug(f"Removing unused file {blob_dir.name}")
+                    shutil.rmtree(blob_dir)
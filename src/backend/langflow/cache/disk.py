@@ -0,0 +1,228 @@
+# Description: Disk cache shared by the workers of a host
+# Insights:
+#   - Files are written to a temporary file and renamed, so readers never see
+#     a partial file, even from another process
+#   - Files are spread in folders by the first characters of their key hash
+#   - An index file keeps the size and last access of each file, so eviction
+#     doesn't need to list and stat the whole cache
+#   - Reads don't lock nor write the index, their accesses are kept in memory
+#     and written with the next change or every atime_interval seconds
+
+import contextlib
+import hashlib
+import json
+import lzma
+import os
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import dill  # type: ignore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Windows, where the index is only locked within the process
+    fcntl = None  # type: ignore
+
+from langflow.utils.logger import logger
+
+COMPRESSIONS = {
+    None: (lambda data: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+FILE_SUFFIX = ".dill"
+
+
+class DiskCache:
+    """
+    Objects serialized with dill in a folder, optionally compressed.
+
+    The cache is bounded by the total size of its files (max_bytes) and
+    the time since they were last read or written (max_age, in seconds).
+    The least recently used files are evicted first.
+    The raw methods store bytes as they are, only compressed.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        compression: Optional[str] = "zlib",
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        shard_width: int = 2,
+        atime_interval: float = 60.0,
+    ):
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression {compression}, "
+                f"it should be one of {list(COMPRESSIONS)}"
+            )
+        self.directory = Path(directory)
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.shard_width = shard_width
+        self.atime_interval = atime_interval
+        self._lock = threading.Lock()
+        # Accesses not written to the index yet, by key hash
+        self._accessed: Dict[str, float] = {}
+        self._accessed_written_at = time.monotonic()
+        # The cached values may hold user data, only the owner can read them
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    @staticmethod
+    def _hash_key(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _get_path(self, key_hash: str) -> Path:
+        return (
+            self.directory / key_hash[: self.shard_width] / f"{key_hash}{FILE_SUFFIX}"
+        )
+
+    @contextlib.contextmanager
+    def _locked_index(self) -> Iterator[Dict[str, Dict[str, float]]]:
+        """Read the index and write it back, locked across processes."""
+        lock_fd = os.open(self.directory / LOCK_FILE, os.O_CREAT | os.O_WRONLY, 0o600)
+        with self._lock, os.fdopen(lock_fd, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                self._merge_accessed(index)
+                yield index
+                self._write_atomically(
+                    self.directory / INDEX_FILE, json.dumps(index).encode("utf-8")
+                )
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge_accessed(self, index: Dict[str, Dict[str, float]]) -> None:
+        accessed, self._accessed = self._accessed, {}
+        self._accessed_written_at = time.monotonic()
+        for key_hash, atime in accessed.items():
+            if key_hash in index:
+                entry = index[key_hash]
+                entry["atime"] = max(entry["atime"], atime)
+
+    def _read_index(self) -> Dict[str, Dict[str, float]]:
+        index_path = self.directory / INDEX_FILE
+        if not index_path.exists():
+            return {}
+        try:
+            return json.loads(index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.debug("The disk cache index is corrupted, rebuilding it")
+            return self._rebuild_index()
+
+    def _rebuild_index(self) -> Dict[str, Dict[str, float]]:
+        index = {}
+        for path in self.directory.glob(f"*/*{FILE_SUFFIX}"):
+            with contextlib.suppress(OSError):
+                stat = path.stat()
+                index[path.stem] = {"size": stat.st_size, "atime": stat.st_mtime}
+        return index
+
+    def _write_atomically(self, path: Path, data: bytes) -> None:
+        # mkstemp creates the file for the owner only
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    def get_raw(self, key: str) -> Optional[bytes]:
+        """Get the bytes stored for a key, None if there are none."""
+        key_hash = self._hash_key(key)
+        try:
+            data = self._get_path(key_hash).read_bytes()
+        except OSError:
+            return None
+        self._accessed[key_hash] = time.time()
+        if time.monotonic() - self._accessed_written_at >= self.atime_interval:
+            with self._locked_index():
+                pass
+        _, decompress = COMPRESSIONS[self.compression]
+        try:
+            return decompress(data)
+        except Exception as exc:
+            logger.debug(f"Error decompressing {key} from the disk cache: {exc}")
+            self.delete(key)
+            return None
+
+    def set_raw(self, key: str, data: bytes) -> None:
+        compress, _ = COMPRESSIONS[self.compression]
+        data = compress(data)
+        key_hash = self._hash_key(key)
+        self._write_atomically(self._get_path(key_hash), data)
+        with self._locked_index() as index:
+            index[key_hash] = {"size": len(data), "atime": time.time()}
+            self._evict(index)
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        data = self.get_raw(key)
+        if data is None:
+            return default
+        try:
+            return dill.loads(data)
+        except Exception as exc:
+            logger.debug(f"Error loading {key} from the disk cache: {exc}")
+            self.delete(key)
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_raw(key, dill.dumps(value))
+
+    def __contains__(self, key: str) -> bool:
+        return self._get_path(self._hash_key(key)).exists()
+
+    def delete(self, key: str) -> None:
+        key_hash = self._hash_key(key)
+        with self._locked_index() as index:
+            self._remove(index, key_hash)
+
+    def clear(self) -> None:
+        with self._locked_index() as index:
+            for key_hash in list(index):
+                self._remove(index, key_hash)
+
+    def evict(self) -> None:
+        """Remove the files that are too old or exceed the size budget."""
+        with self._locked_index() as index:
+            self._evict(index)
+
+    def total_bytes(self) -> int:
+        return int(sum(entry["size"] for entry in self._read_index().values()))
+
+    def _remove(self, index: Dict[str, Dict[str, float]], key_hash: str) -> None:
+        index.pop(key_hash, None)
+        with contextlib.suppress(OSError):
+            os.remove(self._get_path(key_hash))
+
+    def _evict(self, index: Dict[str, Dict[str, float]]) -> None:
+        if self.max_age is not None:
+            oldest_atime = time.time() - self.max_age
+            for key_hash, entry in list(index.items()):
+                if entry["atime"] < oldest_atime:
+                    self._remove(index, key_hash)
+        if self.max_bytes is not None:
+            total_bytes = sum(entry["size"] for entry in index.values())
+            by_access = sorted(index.items(), key=lambda item: item[1]["atime"])
+            for key_hash, entry in by_access:
+                if total_bytes <= self.max_bytes:
+                    break
+                self._remove(index, key_hash)
+                total_bytes -= entry["size"]
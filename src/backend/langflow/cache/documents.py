@@ -0,0 +1,47 @@
+# Description: Cache of the documents loaded from the uploaded files
+# Insights:
+#   - Parsing a large PDF or DOCX takes seconds of CPU, so the documents are
+#     stored by the loader class, its params and the digest of the file
+#   - The path of the file is not part of the key, the same content uploaded
+#     again or to another flow reuses the documents
+#   - Only loaders of uploaded files are cached, a URL may change its content
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from langflow.cache.backends import CacheBackend, get_cache_backend
+from langflow.settings import settings
+
+DOCUMENTS_NAMESPACE = "documents"
+
+
+def get_documents_key(
+    class_object: Any, params: Dict[str, Any], file_digests: Dict[str, str]
+) -> Optional[str]:
+    """Get the key of the documents of a loader, None if it loads no file."""
+    if not file_digests:
+        return None
+    class_path = (
+        f"{getattr(class_object, '__module__', '')}."
+        f"{getattr(class_object, '__qualname__', repr(class_object))}"
+    )
+    content = json.dumps(
+        {
+            "class": class_path,
+            "params": {
+                key: {"file": file_digests[key]} if key in file_digests else value
+                for key, value in params.items()
+            },
+        },
+        sort_keys=True,
+        default=repr,
+    )
+    return f"documents:{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+
+
+def get_documents_backend() -> Optional[CacheBackend]:
+    """Get the backend of the documents cache, None if it is disabled."""
+    if settings.document_cache_backend is None:
+        return None
+    return get_cache_backend(DOCUMENTS_NAMESPACE, settings.document_cache_backend)
@@ -0,0 +1,108 @@
+# Description: Cache of the embeddings of the documents
+# Insights:
+#   - Vectors are stored by the embedding class, its model params and the hash
+#     of the text, so rebuilding a vector store over the same documents
+#     doesn't call the model again
+#   - Only the texts that are not cached are embedded, in a single call
+#   - The queries are embedded once while they are in the query cache
+#   - Credentials and clients are not part of the key, rotating a key
+#     doesn't invalidate the vectors
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from langchain.embeddings.base import Embeddings
+from pydantic import BaseModel
+
+from langflow.cache.backends import CacheBackend, get_cache_backend
+from langflow.cache.queries import get_query_cache
+from langflow.settings import settings
+
+EMBEDDINGS_NAMESPACE = "embeddings"
+
+# Params that don't change the vectors
+EXCLUDED_PARAM_SUFFIXES = ("_key", "_token", "secret", "password", "client", "headers")
+
+
+def get_model_params(embeddings: Embeddings) -> Dict[str, Any]:
+    """Get the params of an embedding model that decide its vectors."""
+    if isinstance(embeddings, BaseModel):
+        params = embeddings.dict()
+    else:
+        params = dict(vars(embeddings))
+    return {
+        name: value
+        for name, value in params.items()
+        if not name.startswith("_")
+        and not name.lower().endswith(EXCLUDED_PARAM_SUFFIXES)
+        and isinstance(value, (str, int, float, bool, type(None), list, dict))
+    }
+
+
+def get_model_hash(embeddings: Embeddings) -> str:
+    embeddings_class = type(embeddings)
+    content = json.dumps(
+        {
+            "class": f"{embeddings_class.__module__}.{embeddings_class.__qualname__}",
+            "params": get_model_params(embeddings),
+        },
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that reuse the vectors already computed for a text."""
+
+    def __init__(self, embeddings: Embeddings, backend: CacheBackend):
+        self.embeddings = embeddings
+        self.backend = backend
+        self.model_hash = get_model_hash(embeddings)
+
+    def _get_key(self, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"embedding:{self.model_hash}:{text_hash}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._get_key(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self.backend.get(key) for key in keys]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        # The same text can be more than once in a batch
+        missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+        if missing_texts:
+            embedded = dict(
+                zip(missing_texts, self.embeddings.embed_documents(missing_texts))
+            )
+            for index in missing:
+                vectors[index] = embedded[texts[index]]
+            for text, vector in embedded.items():
+                self.backend.set(self._get_key(text), vector)
+        return vectors  # type: ignore
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are short lived, they are only kept in memory
+        key = ("embed_query", self.model_hash, text)
+        return get_query_cache().get_or_set(
+            key, lambda: self.embeddings.embed_query(text)
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        # The wrapped model keeps its attributes, e.g. for the vector stores
+        # that read them
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+def cache_embeddings(embeddings: Any) -> Any:
+    """Wrap an embedding model with the embeddings cache, if it is enabled."""
+    if (
+        settings.embedding_cache_backend is None
+        or not isinstance(embeddings, Embeddings)
+        or isinstance(embeddings, CachedEmbeddings)
+    ):
+        return embeddings
+    backend = get_cache_backend(EMBEDDINGS_NAMESPACE, settings.embedding_cache_backend)
+    return CachedEmbeddings(embeddings, backend)
@@ -0,0 +1,290 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    weight: int
+    expires_at: Optional[float]
+
+
+def estimate_size(obj: Any, max_objects: int = 10000) -> int:
+    """
+    Estimate the memory used by an object and the objects it references,
+    in bytes. Only the first max_objects objects are counted.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, type):
+            continue
+        seen.add(id(current))
+        try:
+            size += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        if hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+    return size
+
+
+class LRUCache:
+    """
+    Thread safe cache that evicts the least recently used items.
+
+    Besides the number of items, the cache can be bounded by the age of
+    the items (ttl, in seconds) and by their total weight (max_weight).
+    The weight of an item is computed by the weigh function, its
+    estimated size in bytes by default.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: Optional[float] = None,
+        max_weight: Optional[int] = None,
+        weigh: Callable[[Any], int] = estimate_size,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self._lock = threading.RLock()
+        self._items: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._weight = 0
+        # Computations in flight by key, see get_or_set and aget_or_set
+        self._pending: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _get_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._items.pop(key)
+        self._weight -= entry.weight
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Get an item and mark it as the most recently used."""
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return entry.value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Add an item, evicting the least recently used ones if needed."""
+        if self.maxsize <= 0:
+            return
+        weight = self.weigh(value) if self.max_weight is not None else 0
+        if self.max_weight is not None and weight > self.max_weight:
+            # It would evict everything else and still not fit
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[key] = CacheEntry(value, weight, expires_at)
+            self._weight += weight
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._items and (
+            len(self._items) > self.maxsize
+            or (self.max_weight is not None and self._weight > self.max_weight)
+        ):
+            self._remove(next(iter(self._items)))
+            self.evictions += 1
+
+    def configure(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        max_weight: Optional[int] = None,
+    ) -> None:
+        """
+        Change the bounds of the cache, the items that don't fit anymore
+        are evicted. The new ttl applies to the items added from now on.
+        """
+        with self._lock:
+            if (maxsize, ttl, max_weight) == (self.maxsize, self.ttl, self.max_weight):
+                return
+            if max_weight is not None and self.max_weight is None:
+                # The items were not weighed while the weight had no limit
+                for key, entry in list(self._items.items()):
+                    self._items[key] = entry._replace(weight=self.weigh(entry.value))
+                self._weight = sum(entry.weight for entry in self._items.values())
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self.max_weight = max_weight
+            self._evict()
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Get an item or compute it with the factory and add it.
+        Concurrent calls with the same missing key wait for one computation.
+        """
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is not None:
+                self.hits += 1
+                self._items.move_to_end(key)
+                return entry.value
+            future = self._pending.get(key)
+            is_owner = future is None
+            if is_owner:
+                self.misses += 1
+                future = self._pending[key] = Future()
+            else:
+                # Waiting for a computation in flight counts as a hit
+                self.hits += 1
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = factory()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    async def aget_or_set(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Same as get_or_set for a coroutine factory."""
+        while True:
+            with self._lock:
+                entry = self._get_entry(key)
+                if entry is not None:
+                    self.hits += 1
+                    self._items.move_to_end(key)
+                    return entry.value
+                future = self._pending.get(key)
+                is_owner = future is None
+                if is_owner:
+                    self.misses += 1
+                    future = self._pending[key] = Future()
+                else:
+                    self.hits += 1
+            if not is_owner:
+                try:
+                    # Shielded so that cancelling a waiter doesn't cancel the others
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        # The computation was cancelled, not this call
+                        continue
+                    raise
+            break
+
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._items)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._weight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the counters and the current size of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "weight": self._weight,
+                "max_weight": self.max_weight,
+                "ttl": self.ttl,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._get_entry(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# Caches whose stats are exposed by the API, by name
+CACHES: Dict[str, LRUCache] = {}
+
+
+def register_cache(name: str, cache: LRUCache, replace: bool = False) -> LRUCache:
+    """
+    Register a cache so that its stats are reported by get_cache_stats.
+    Another cache with the same name is only replaced if replace is set.
+    """
+    if not replace and CACHES.get(name, cache) is not cache:
+        raise ValueError(f"A cache named {name} is already registered")
+    CACHES[name] = cache
+    return cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -1,4 +1,5 @@
 from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any, Awaitable, Callable, List, Optional
 
 import pandas as pd
@@ -55,8 +56,19 @@ class CacheManager(Subject):
     def __init__(self):
         super().__init__()
         self.CACHE = {}
-        self.current_client_id = None
-        self.current_cache = {}
+        # The client is set per context, so that the requests of
+        # different clients served concurrently don't overwrite it
+        self._client_id: ContextVar[Optional[str]] = ContextVar(
+            f"client_id_{id(self)}", default=None
+        )
+
+    @property
+    def current_client_id(self) -> Optional[str]:
+        return self._client_id.get()
+
+    @property
+    def current_cache(self) -> dict:
+        return self.CACHE.setdefault(self.current_client_id, {})
 
     @contextmanager
     def set_client_id(self, client_id: str):
@@ -66,14 +78,11 @@ class CacheManager(Subject):
         Args:
             client_id (str): The client identifier.
         """
-        previous_client_id = self.current_client_id
-        self.current_client_id = client_id
-        self.current_cache = self.CACHE.setdefault(client_id, {})
+        token = self._client_id.set(client_id)
         try:
             yield
         finally:
-            self.current_client_id = previous_client_id
-            self.current_cache = self.CACHE.get(self.current_client_id, {})
+            self._client_id.reset(token)
 
     def add(self, name: str, obj: Any, obj_type: str, extension: Optional[str] = None):
         """
@@ -0,0 +1,84 @@
+# Description: Cache of the queries to the vector stores
+# Insights:
+#   - Chats ask the same questions over and over, so the documents found for
+#     a query are kept by the store, the query and the number of documents
+#   - Each built store gets its own id, the results of a store are
+#     invalidated when it is rebuilt
+#   - Entries expire after a while, stores may be updated from outside
+
+import functools
+import uuid
+from typing import Any, Callable, Hashable, Optional
+
+from langflow.cache.lru import LRUCache, register_cache
+from langflow.settings import settings
+
+QUERY_CACHE_ID = "_query_cache_id"
+
+# Bounded by get_query_cache
+query_cache = register_cache("queries", LRUCache())
+
+
+def get_query_cache() -> LRUCache:
+    """Get the cache of the queries, bounded by the current settings."""
+    query_cache.configure(
+        maxsize=settings.query_cache_size, ttl=settings.query_cache_ttl
+    )
+    return query_cache
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+def get_query_cache_id(vector_store: Any) -> Optional[str]:
+    return getattr(vector_store, QUERY_CACHE_ID, None)
+
+
+def _cache_search(cache_id: str, search: Callable) -> Callable:
+    @functools.wraps(search)
+    def cached_search(query: str, k: int = 4, *args: Any, **kwargs: Any) -> Any:
+        # Some stores take more arguments by position, e.g. a filter
+        try:
+            key = (cache_id, search.__name__, query, k, _freeze(args), _freeze(kwargs))
+        except TypeError:
+            # Filters that can't be hashed
+            return search(query, k, *args, **kwargs)
+        # A copy, so callers can't change the cached list
+        return list(
+            get_query_cache().get_or_set(key, lambda: search(query, k, *args, **kwargs))
+        )
+
+    return cached_search
+
+
+def cache_queries(vector_store: Any) -> Any:
+    """Cache the similarity searches of a vector store, if the cache is enabled."""
+    if get_query_cache().maxsize <= 0 or get_query_cache_id(vector_store) is not None:
+        return vector_store
+    cache_id = uuid.uuid4().hex
+    try:
+        setattr(vector_store, QUERY_CACHE_ID, cache_id)
+    except (AttributeError, TypeError, ValueError):
+        # Stores that don't accept new attributes are not cached
+        return vector_store
+    for name in ["similarity_search", "similarity_search_with_score"]:
+        if hasattr(vector_store, name):
+            search = getattr(vector_store, name)
+            setattr(vector_store, name, _cache_search(cache_id, search))
+    return vector_store
+
+
+def invalidate_queries(vector_store: Any) -> None:
+    """Remove the cached results of a vector store."""
+    cache_id = get_query_cache_id(vector_store)
+    if cache_id is None:
+        return
+    for key in query_cache.keys():
+        if isinstance(key, tuple) and key[0] == cache_id:
+            query_cache.delete(key)
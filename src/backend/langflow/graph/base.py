@@ -4,29 +4,103 @@
 #   - Build each inner agent first, then build the outer agent
 
 import contextlib
+import hashlib
 import inspect
+import json
 import types
 import warnings
-from copy import deepcopy
-from typing import Any, Dict, List, Optional
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 from langflow.cache import base as cache_utils
+from langflow.graph.clone import ClonePolicy, clone_built_object, get_clone_policy
+from langflow.graph.compatibility import type_compatibility
 from langflow.graph.constants import DIRECT_TYPES
+from langflow.graph.engine import build_node, run_in_build_executor
 from langflow.interface import loading
-from langflow.interface.listing import ALL_TYPES_DICT
 from langflow.utils.logger import logger
 from langflow.utils.util import sync_to_async
 
+if TYPE_CHECKING:
+    from langflow.graph.plan import PlanNode
+
 
 class Node:
     def __init__(self, data: Dict, base_type: Optional[str] = None) -> None:
         self.id: str = data["id"]
         self._data = data
+        self._init_state(base_type)
+        self._parse_data()
+
+    def _init_state(self, base_type: Optional[str]) -> None:
         self.edges: List[Edge] = []
+        self._incoming_edges_by_type: Dict[Optional[int], List[Edge]] = {}
         self.base_type: Optional[str] = base_type
-        self._parse_data()
+        self.params: Dict = {}
+        self._file_digests: Dict[str, str] = {}
         self._built_object = None
         self._built = False
+        # Set by the graph, see compute_content_hashes
+        self.content_hash: Optional[str] = None
+        # The content hash of the node when its object was built
+        self._built_hash: Optional[str] = None
+
+    @classmethod
+    def from_plan(cls, plan_node: "PlanNode") -> "Node":
+        """
+        Create a node from a compiled plan without parsing a template.
+        The params that point to other nodes are set by the graph.
+        """
+        node = cls.__new__(cls)
+        node.id = plan_node.id
+        node.data = {
+            "type": plan_node.node_type,
+            "node": {"base_classes": plan_node.output},
+        }
+        node._data = {"id": plan_node.id, "data": node.data}
+        node._init_state(plan_node.base_type)
+        node.node_type = plan_node.node_type
+        node.output = plan_node.output
+        node.required_inputs = []
+        node.optional_inputs = []
+        node.output_type_ids = type_compatibility.intern_all(node.output)
+        node.input_type_ids = ()
+        node.params = dict(plan_node.params)
+        for key, plan_file in plan_node.files.items():
+            node.params[key] = node._save_file(
+                key,
+                file_name=plan_file.name,
+                content=plan_file.content,
+                accepted_types=plan_file.suffixes,
+                digest=plan_file.digest,
+            )
+        return node
+
+    def _save_file(
+        self,
+        key: str,
+        file_name: str,
+        content: str,
+        accepted_types: List[str],
+        digest: Optional[str] = None,
+    ) -> str:
+        """Save an uploaded file to the blob store and hold a reference to it."""
+        # Files already in the store are neither decoded nor written again
+        file_path = cache_utils.save_binary_file(
+            content=content,
+            file_name=file_name,
+            accepted_types=accepted_types,
+            digest=digest,
+        )
+        if digest is None:
+            # Hashed already with the flow, the digest is memoized
+            digest = cache_utils.get_content_digest(content)
+        self._file_digests[key] = digest
+        blob_store = cache_utils.get_blob_store()
+        blob_store.acquire(digest)
+        # The reference is released when the node is garbage collected
+        weakref.finalize(self, blob_store.release, digest)
+        return file_path
 
     def _parse_data(self) -> None:
         self.data = self._data["data"]
@@ -48,15 +122,21 @@ class Node:
             if not value["required"]
         ]
 
+        # Intern the types so that edges are validated with cached lookups
+        self.output_type_ids = type_compatibility.intern_all(self.output)
+        self.input_type_ids = type_compatibility.intern_all(
+            self.required_inputs + self.optional_inputs
+        )
+
         template_dict = self.data["node"]["template"]
         self.node_type = (
             self.data["type"] if "Tool" not in self.output else template_dict["_type"]
         )
         if self.base_type is None:
-            for base_type, value in ALL_TYPES_DICT.items():
-                if self.node_type in value:
-                    self.base_type = base_type
-                    break
+            # Imported here to avoid circular imports
+            from langflow.graph.registry import node_registry
+
+            self.base_type = node_registry.get_base_type(self.node_type)
 
     def _build_params(self):
         # Some params are required, some are optional
@@ -88,22 +168,16 @@ class Node:
                 # Load the type in value.get('suffixes') using
                 # what is inside value.get('content')
                 # value.get('value') is the file name
-                file_name = value.get("value")
-                content = value.get("content")
-                type_to_load = value.get("suffixes")
-                file_path = cache_utils.save_binary_file(
-                    content=content, file_name=file_name, accepted_types=type_to_load
+                params[key] = self._save_file(
+                    key,
+                    file_name=value.get("value"),
+                    content=value.get("content"),
+                    accepted_types=value.get("suffixes"),
                 )
 
-                params[key] = file_path
-
             elif value.get("type") not in DIRECT_TYPES:
                 # Get the edge that connects to this node
-                edges = [
-                    edge
-                    for edge in self.edges
-                    if edge.target == self and edge.matched_type in value["type"]
-                ]
+                edges = self.get_incoming_edges_by_type(value["type"])
 
                 # Get the output of the node that the edge connects to
                 # if the value['list'] is True, then there will be more
@@ -138,25 +212,80 @@ class Node:
         # Add _type to params
         self.params = params
 
-    def _build(self):
+    def get_dependencies(self) -> List["Node"]:
+        """Get the nodes that have to be built before this one."""
+        dependencies: List[Node] = []
+        for value in self.params.values():
+            if isinstance(value, Node):
+                dependencies.append(value)
+            elif isinstance(value, list):
+                dependencies.extend(node for node in value if isinstance(node, Node))
+        return [node for node in dependencies if node != self]
+
+    def _compute_content_hash(self) -> str:
+        """
+        Hash the node type, its literal params, the content of its files
+        and the content hashes of the nodes it depends on.
+
+        The dependencies must have their content hash set already.
+        """
+        params: Dict[str, Any] = {}
+        for key, value in self.params.items():
+            if isinstance(value, Node):
+                params[key] = {"node": value.content_hash}
+            elif isinstance(value, list) and any(isinstance(v, Node) for v in value):
+                params[key] = [
+                    {"node": v.content_hash} if isinstance(v, Node) else v
+                    for v in value
+                ]
+            elif key in self._file_digests:
+                params[key] = {"file": self._file_digests[key]}
+            else:
+                params[key] = value
+        # Dependencies that are not params, e.g. the tools of a prompt
+        dependencies = sorted(
+            node.content_hash
+            for node in self.get_dependencies()
+            if node.content_hash is not None
+        )
+        content = json.dumps(
+            {
+                "node_type": self.node_type,
+                "base_type": self.base_type,
+                "params": params,
+                "dependencies": dependencies,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def reuse_built_object(self, other: "Node") -> None:
+        """Take the built object of an unchanged node from a previous graph."""
+        self._built_object = other._built_object
+        self._built = other._built
+        self._built_hash = other._built_hash
+
+    def _prepare_params(self, params: Dict) -> None:
+        """Hook to adjust the resolved params before instantiating the class."""
+
+    def _resolve_params(self) -> Dict:
         # The params dict is used to build the module
         # it contains values and keys that point to nodes which
         # have their own params dict
-        # When build is called, we iterate through the params dict
-        # and if the value is a node, we call build on that node
-        # and use the output of that build as the value for the param
+        # The build engine builds those nodes first, so here we only
+        # take the output of their build as the value for the param
         # if the value is not a node, then we use the value as the param
         # and continue
-        # Another aspect is that the node_type is the class that we need to import
-        # and instantiate with these built params
-        logger.debug(f"Building {self.node_type}")
-        # Build each node in the params dict
-        for key, value in self.params.copy().items():
+        # The params are resolved into a copy so that self.params keeps
+        # pointing to the nodes and the node can be rebuilt
+        params = self.params.copy()
+        for key, value in self.params.items():
             # Check if Node or list of Nodes and not self
             # to avoid recursion
             if isinstance(value, Node):
                 if value == self:
-                    del self.params[key]
+                    del params[key]
                     continue
                 result = value.build()
                 # If the key is "func", then we need to use the run method
@@ -170,58 +299,131 @@ class Node:
                         elif hasattr(result, "get_function"):
                             result = result.get_function()  # type: ignore
                     elif inspect.iscoroutinefunction(result):
-                        self.params["coroutine"] = result
+                        params["coroutine"] = result
                     else:
                         # turn result which is a function into a coroutine
                         # so that it can be awaited
-                        self.params["coroutine"] = sync_to_async(result)
+                        params["coroutine"] = sync_to_async(result)
 
-                self.params[key] = result
+                params[key] = result
             elif isinstance(value, list) and all(
                 isinstance(node, Node) for node in value
             ):
-                self.params[key] = [node.build() for node in value]  # type: ignore
+                params[key] = [node.build() for node in value]  # type: ignore
+
+        self._prepare_params(params)
+        return params
+
+    def _get_class_object(self) -> Any:
+        # Imported here to avoid circular imports
+        from langflow.graph.registry import node_registry
+
+        return node_registry.get_import_target(self.base_type, self.node_type)
+
+    def _set_built_object(self, built_object: Any) -> None:
+        if built_object is None:
+            raise ValueError(f"Node type {self.node_type} not found")
+        self._built_object = built_object
+        self._built = True
+        self._built_hash = self.content_hash
+
+    def _get_cache_key(self) -> Optional[str]:
+        # The content hash only describes the built object if the
+        # dependencies were built from the content their hashes describe
+        if self.content_hash is None or any(
+            node._built_hash != node.content_hash for node in self.get_dependencies()
+        ):
+            return None
+        return self.content_hash
+
+    def _build(self):
+        # Another aspect is that the node_type is the class that we need to import
+        # and instantiate with the built params
+        logger.debug(f"Building {self.node_type}")
+        params = self._resolve_params()
 
         # Get the class from LANGCHAIN_TYPES_DICT
         # and instantiate it with the params
         # and return the instance
 
         try:
-            self._built_object = loading.instantiate_class(
+            built_object = loading.instantiate_class(
                 node_type=self.node_type,
                 base_type=self.base_type,
-                params=self.params,
+                params=params,
+                class_object=self._get_class_object(),
+                cache_key=self._get_cache_key(),
             )
         except Exception as exc:
             raise ValueError(
                 f"Error building node {self.node_type}: {str(exc)}"
             ) from exc
 
-        if self._built_object is None:
-            raise ValueError(f"Node type {self.node_type} not found")
+        self._set_built_object(built_object)
 
-        self._built = True
+    async def _abuild(self):
+        """Build the node without blocking the event loop."""
+        try:
+            class_object = self._get_class_object()
+        except Exception:
+            class_object = None
+        if not loading.has_async_constructor(self.base_type, class_object):
+            # Blocking constructors run on the build thread pool
+            await run_in_build_executor(self._build)
+            return
+
+        logger.debug(f"Building {self.node_type} asynchronously")
+        # Resolving the params copies the built dependencies
+        params = await run_in_build_executor(self._resolve_params)
+        try:
+            built_object = await loading.ainstantiate_class(
+                node_type=self.node_type,
+                base_type=self.base_type,
+                params=params,
+                class_object=class_object,
+                cache_key=self._get_cache_key(),
+            )
+        except Exception as exc:
+            raise ValueError(
+                f"Error building node {self.node_type}: {str(exc)}"
+            ) from exc
+
+        self._set_built_object(built_object)
 
     def build(self, force: bool = False) -> Any:
         if not self._built or force:
-            self._build()
-
-        #! Deepcopy is breaking for vectorstores
-        if self.base_type in [
-            "vectorstores",
-            "VectorStoreRouterAgent",
-            "VectorStoreAgent",
-            "VectorStoreInfo",
-        ] or self.node_type in [
-            "VectorStoreInfo",
-            "VectorStoreRouterToolkit",
-            "SQLDatabase",
-        ]:
-            return self._built_object
-        return deepcopy(self._built_object)
+            # The engine builds the nodes this one depends on
+            # in topological order before building it
+            build_node(self, force=force)
+        return self._copy_built_object()
+
+    @property
+    def clone_policy(self) -> ClonePolicy:
+        return get_clone_policy(self.node_type, self.base_type)
+
+    def _copy_built_object(self) -> Any:
+        # Each type declares how its built object is copied,
+        # so shared immutable pieces are never copied
+        return clone_built_object(self._built_object, self.clone_policy)
 
     def add_edge(self, edge: "Edge") -> None:
         self.edges.append(edge)
+        if edge.target == self:
+            self._incoming_edges_by_type.setdefault(edge.matched_type_id, []).append(
+                edge
+            )
+
+    def get_incoming_edges_by_type(self, input_type: str) -> List["Edge"]:
+        """Get the incoming edges whose matched type fits an input type."""
+        input_type_id = type_compatibility.intern(input_type)
+        edges = [
+            edge
+            for matched_type_id, typed_edges in self._incoming_edges_by_type.items()
+            if type_compatibility.is_compatible(matched_type_id, input_type_id)
+            for edge in typed_edges
+        ]
+        # Keep the order in which the edges were added
+        return sorted(edges, key=self.edges.index) if len(edges) > 1 else edges
 
     def __repr__(self) -> str:
         return f"Node(id={self.id}, data={self.data})"
@@ -237,10 +439,20 @@ class Node:
 
 
 class Edge:
-    def __init__(self, source: "Node", target: "Node"):
+    def __init__(
+        self, source: "Node", target: "Node", matched_type: Optional[str] = None
+    ):
         self.source: "Node" = source
         self.target: "Node" = target
-        self.validate_edge()
+        if matched_type is None:
+            self.validate_edge()
+        else:
+            # The edge was validated when the flow was compiled
+            self.source_types = self.source.output
+            self.target_reqs = []
+            self.matched_type = matched_type
+            self.matched_type_id = type_compatibility.intern(matched_type)
+            self.valid = True
 
     def validate_edge(self) -> None:
         # Validate that the outputs of the source node are valid inputs
@@ -250,27 +462,18 @@ class Edge:
         # Both lists contain strings and sometimes a string contains the value we are
         # looking for e.g. comgin_out=["Chain"] and target_reqs=["LLMChain"]
         # so we need to check if any of the strings in source_types is in target_reqs
-        self.valid = any(
-            output in target_req
-            for output in self.source_types
-            for target_req in self.target_reqs
+        # The matches are cached by type ids, so this is a lookup for known types
+        self.matched_type_id = type_compatibility.match(
+            self.source.output_type_ids, self.target.input_type_ids
         )
+        self.valid = self.matched_type_id is not None
         # Get what type of input the target node is expecting
-
-        self.matched_type = next(
-            (
-                output
-                for output in self.source_types
-                for target_req in self.target_reqs
-                if output in target_req
-            ),
-            None,
+        self.matched_type = (
+            type_compatibility.name(self.matched_type_id) if self.valid else None
         )
-        no_matched_type = self.matched_type is None
-        if no_matched_type:
+        if not self.valid:
             logger.debug(self.source_types)
             logger.debug(self.target_reqs)
-        if no_matched_type:
             raise ValueError(
                 f"Edge between {self.source.node_type} and {self.target.node_type} "
                 f"has no matched type"
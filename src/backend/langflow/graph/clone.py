@@ -0,0 +1,87 @@
+from copy import copy, deepcopy
+from enum import Enum
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class ClonePolicy(str, Enum):
+    """How a built object is copied every time a node hands it out."""
+
+    # The same object is shared: it is immutable in practice
+    # or it can't be copied (vector stores, databases)
+    SHARE = "share"
+    # A new object that shares its attributes with the built one
+    SHALLOW = "shallow"
+    # A shallow copy whose mutable state (e.g. memory) is deep copied
+    MUTABLE_STATE = "mutable_state"
+    # A full copy, for unknown types
+    DEEP = "deep"
+
+
+# Attributes copied by the MUTABLE_STATE policy
+MUTABLE_STATE_FIELDS = ["memory"]
+
+# Policies by node type, they take precedence over the base type ones
+NODE_TYPE_CLONE_POLICIES = {
+    "VectorStoreInfo": ClonePolicy.SHARE,
+    "VectorStoreRouterToolkit": ClonePolicy.SHARE,
+    "VectorStoreAgent": ClonePolicy.SHARE,
+    "VectorStoreRouterAgent": ClonePolicy.SHARE,
+    "SQLDatabase": ClonePolicy.SHARE,
+    "SQLAgent": ClonePolicy.SHARE,
+}
+
+BASE_TYPE_CLONE_POLICIES = {
+    "llms": ClonePolicy.SHALLOW,
+    # Some chains set the template of their prompt
+    "prompts": ClonePolicy.SHALLOW,
+    "tools": ClonePolicy.SHARE,
+    "toolkits": ClonePolicy.SHARE,
+    "wrappers": ClonePolicy.SHALLOW,
+    "utilities": ClonePolicy.SHARE,
+    "embeddings": ClonePolicy.SHARE,
+    "vectorstores": ClonePolicy.SHARE,
+    "documentloaders": ClonePolicy.SHARE,
+    "textsplitters": ClonePolicy.SHARE,
+    "chains": ClonePolicy.MUTABLE_STATE,
+    "agents": ClonePolicy.MUTABLE_STATE,
+    "memory": ClonePolicy.DEEP,
+}
+
+
+def get_clone_policy(node_type: str, base_type: Optional[str]) -> ClonePolicy:
+    """Get the clone policy of a node type."""
+    if node_type in NODE_TYPE_CLONE_POLICIES:
+        return NODE_TYPE_CLONE_POLICIES[node_type]
+    if base_type in BASE_TYPE_CLONE_POLICIES:
+        return BASE_TYPE_CLONE_POLICIES[base_type]  # type: ignore
+    return ClonePolicy.DEEP
+
+
+def clone_built_object(built_object: Any, policy: ClonePolicy) -> Any:
+    """Copy a built object according to a clone policy."""
+    if policy == ClonePolicy.SHARE or built_object is None:
+        return built_object
+    if policy == ClonePolicy.DEEP:
+        return deepcopy(built_object)
+
+    if policy == ClonePolicy.SHALLOW:
+        update = {}
+    else:
+        update = {
+            field: deepcopy(getattr(built_object, field))
+            for field in MUTABLE_STATE_FIELDS
+            if getattr(built_object, field, None) is not None
+        }
+    # BaseModel.copy would drop the fields excluded from
+    # serialization, such as the callbacks of chains
+    cloned = copy(built_object)
+    if isinstance(built_object, BaseModel):
+        # The copy of a BaseModel shares its __dict__ with the original
+        object.__setattr__(cloned, "__dict__", dict(built_object.__dict__))
+        object.__setattr__(cloned, "__fields_set__", set(built_object.__fields_set__))
+    for field, value in update.items():
+        # Bypass the validation of BaseModel assignments
+        object.__setattr__(cloned, field, value)
+    return cloned
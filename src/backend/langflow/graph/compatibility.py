@@ -0,0 +1,79 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langflow.cache.lru import LRUCache, register_cache
+
+# Marks a pair of types that is not in the caches yet
+_MISSING = object()
+
+
+class TypeCompatibility:
+    """
+    Interns base classes and input types into ids and caches which
+    source types can be connected to which input types.
+
+    A source type is compatible with an input type when its name is
+    contained in the input type e.g. "Chain" and "LLMChain", or
+    "BaseLanguageModel" and "Optional[BaseLanguageModel]".
+    The caches live as long as the process, so they are shared by every
+    request, and keep the maxsize most recently used pairs. The ids are
+    held by the built graphs, so every interned name is kept.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self.matrix = LRUCache(maxsize=maxsize)
+        self.matches = LRUCache(maxsize=maxsize)
+
+    def intern(self, type_name: str) -> int:
+        """Get the id of a type name."""
+        type_id = self._ids.get(type_name)
+        if type_id is None:
+            with self._lock:
+                type_id = self._ids.get(type_name)
+                if type_id is None:
+                    type_id = len(self._names)
+                    self._names.append(type_name)
+                    self._ids[type_name] = type_id
+        return type_id
+
+    def intern_all(self, type_names: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self.intern(type_name) for type_name in type_names)
+
+    def name(self, type_id: int) -> str:
+        return self._names[type_id]
+
+    def is_compatible(self, source_id: int, target_id: int) -> bool:
+        """Check if a source type can be connected to an input type."""
+        key = (source_id, target_id)
+        compatible = self.matrix.get(key, _MISSING)
+        if compatible is _MISSING:
+            compatible = self._names[source_id] in self._names[target_id]
+            self.matrix.set(key, compatible)
+        return compatible  # type: ignore
+
+    def match(
+        self, source_ids: Tuple[int, ...], target_ids: Tuple[int, ...]
+    ) -> Optional[int]:
+        """Get the first source type that is compatible with any of the input types."""
+        key = (source_ids, target_ids)
+        matched_id = self.matches.get(key, _MISSING)
+        if matched_id is _MISSING:
+            matched_id = next(
+                (
+                    source_id
+                    for source_id in source_ids
+                    for target_id in target_ids
+                    if self.is_compatible(source_id, target_id)
+                ),
+                None,
+            )
+            self.matches.set(key, matched_id)
+        return matched_id  # type: ignore
+
+
+type_compatibility = TypeCompatibility()
+register_cache("type_compatibility", type_compatibility.matrix)
+register_cache("type_matches", type_compatibility.matches)
@@ -0,0 +1,217 @@
+# Description: Build engine that replaces the recursion through Node.build
+# Insights:
+#   - Sort the nodes once so that every dependency is built before its dependents
+#   - Detect cycles before anything is built
+#   - Group the nodes in levels so that each level only depends on the previous ones
+#   - Nodes of the same level are independent, so they can be built in parallel
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from langflow.settings import settings
+from langflow.utils.logger import logger
+
+if TYPE_CHECKING:
+    from langflow.graph.base import Node
+
+T = TypeVar("T")
+
+
+def collect_dependencies(targets: Iterable["Node"]) -> List["Node"]:
+    """Get the targets and every node they depend on, directly or not."""
+    collected: Dict[str, "Node"] = {}
+    stack = list(targets)
+    while stack:
+        node = stack.pop()
+        if node.id in collected:
+            continue
+        collected[node.id] = node
+        stack.extend(
+            dependency
+            for dependency in node.get_dependencies()
+            if dependency.id not in collected
+        )
+    return list(collected.values())
+
+
+def sort_levels(nodes: Iterable["Node"]) -> List[List["Node"]]:
+    """
+    Sort the nodes topologically and group them in levels.
+
+    Every node in a level only depends on nodes of the previous levels,
+    so the nodes of a level can be built in any order.
+    Dependencies outside of the given nodes are ignored.
+    """
+    nodes_by_id = {node.id: node for node in nodes}
+    in_degree = {node_id: 0 for node_id in nodes_by_id}
+    dependents: Dict[str, List[str]] = {node_id: [] for node_id in nodes_by_id}
+    for node in nodes_by_id.values():
+        dependency_ids = {dependency.id for dependency in node.get_dependencies()}
+        for dependency_id in dependency_ids:
+            if dependency_id not in nodes_by_id:
+                continue
+            in_degree[node.id] += 1
+            dependents[dependency_id].append(node.id)
+
+    levels: List[List["Node"]] = []
+    current = [node_id for node_id, degree in in_degree.items() if degree == 0]
+    sorted_count = 0
+    while current:
+        levels.append([nodes_by_id[node_id] for node_id in current])
+        sorted_count += len(current)
+        next_level = []
+        for node_id in current:
+            for dependent_id in dependents[node_id]:
+                in_degree[dependent_id] -= 1
+                if in_degree[dependent_id] == 0:
+                    next_level.append(dependent_id)
+        current = next_level
+
+    if sorted_count != len(nodes_by_id):
+        cycle = [
+            nodes_by_id[node_id].node_type
+            for node_id, degree in in_degree.items()
+            if degree > 0
+        ]
+        raise ValueError(f"The flow has a cycle between the nodes: {cycle}")
+    return levels
+
+
+def compute_content_hashes(nodes: Iterable["Node"]) -> Dict[str, str]:
+    """
+    Set the content hash of every node, dependencies first,
+    and return them by node id.
+    """
+    hashes: Dict[str, str] = {}
+    for level in sort_levels(collect_dependencies(nodes)):
+        for node in level:
+            node.content_hash = node._compute_content_hash()
+            hashes[node.id] = node.content_hash
+    return hashes
+
+
+class BuildError(ValueError):
+    """Raised when one or more nodes of a level failed to build in parallel."""
+
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+        messages = "\n".join(f"{node_id}: {exc}" for node_id, exc in errors.items())
+        super().__init__(f"Error building {len(errors)} nodes:\n{messages}")
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_build_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool shared by every parallel build, a new one when
+    the build_workers setting changed.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor._max_workers != settings.build_workers:
+            if _executor is not None:
+                # The running builds finish on the old threads
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.build_workers, thread_name_prefix="langflow-build"
+            )
+        return _executor
+
+
+def _build_one(node: "Node") -> None:
+    logger.debug(f"Building {node.node_type} ({node.id})")
+    node._build()
+
+
+def _raise_errors(errors: Dict[str, BaseException]) -> None:
+    if len(errors) == 1:
+        raise next(iter(errors.values()))
+    if errors:
+        raise BuildError(errors)  # type: ignore
+
+
+def _build_level_in_parallel(nodes: List["Node"]) -> None:
+    executor = get_build_executor()
+    futures = {node.id: executor.submit(_build_one, node) for node in nodes}
+    # Wait for the whole level so that every error is reported
+    errors: Dict[str, BaseException] = {}
+    for node_id, future in futures.items():
+        try:
+            future.result()
+        except Exception as exc:
+            errors[node_id] = exc
+    _raise_errors(errors)
+
+
+async def run_in_build_executor(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking function on the build thread pool."""
+    loop = asyncio.get_running_loop()
+    # Keep the context, e.g. the current client, in the thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_build_executor(), functools.partial(context.run, func, *args)
+    )
+
+
+def build_node(
+    target: "Node", force: bool = False, parallel: Optional[bool] = None
+) -> None:
+    """
+    Build a node and every node it depends on that is not built yet.
+
+    If force is True the target is rebuilt even if it was already built.
+    If parallel is True the nodes of each level are built on a shared
+    thread pool. It defaults to the parallel_build setting.
+    """
+    if parallel is None:
+        parallel = settings.parallel_build
+    levels = sort_levels(collect_dependencies([target]))
+    for level in levels:
+        to_build = [
+            node for node in level if not node._built or (force and node == target)
+        ]
+        if parallel and len(to_build) > 1:
+            _build_level_in_parallel(to_build)
+        else:
+            for node in to_build:
+                _build_one(node)
+
+
+async def abuild_node(
+    target: "Node", force: bool = False, parallel: Optional[bool] = None
+) -> None:
+    """
+    Build a node and its dependencies without blocking the event loop.
+
+    Natively async constructors are awaited and blocking ones run on the
+    build thread pool. If parallel is True the nodes of each level are
+    built concurrently, otherwise one at a time. It defaults to the
+    parallel_build setting.
+    """
+    if parallel is None:
+        parallel = settings.parallel_build
+    levels = sort_levels(collect_dependencies([target]))
+    for level in levels:
+        to_build = [
+            node for node in level if not node._built or (force and node == target)
+        ]
+        if not parallel or len(to_build) < 2:
+            for node in to_build:
+                await node._abuild()
+            continue
+        results = await asyncio.gather(
+            *(node._abuild() for node in to_build), return_exceptions=True
+        )
+        _raise_errors(
+            {
+                node.id: result
+                for node, result in zip(to_build, results)
+                if isinstance(result, BaseException)
+            }
+        )
@@ -1,35 +1,20 @@
-from typing import Dict, List, Type, Union
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Type, Union
 
 from langflow.graph.base import Edge, Node
-from langflow.graph.nodes import (
-    AgentNode,
-    ChainNode,
-    DocumentLoaderNode,
-    EmbeddingNode,
-    FileToolNode,
-    LLMNode,
-    MemoryNode,
-    PromptNode,
-    TextSplitterNode,
-    ToolkitNode,
-    ToolNode,
-    VectorStoreNode,
-    WrapperNode,
+from langflow.graph.engine import (
+    abuild_node,
+    build_node,
+    compute_content_hashes,
+    run_in_build_executor,
 )
-from langflow.interface.agents.base import agent_creator
-from langflow.interface.chains.base import chain_creator
-from langflow.interface.document_loaders.base import documentloader_creator
-from langflow.interface.embeddings.base import embedding_creator
-from langflow.interface.llms.base import llm_creator
-from langflow.interface.memories.base import memory_creator
-from langflow.interface.prompts.base import prompt_creator
-from langflow.interface.text_splitters.base import textsplitter_creator
-from langflow.interface.toolkits.base import toolkits_creator
-from langflow.interface.tools.base import tool_creator
-from langflow.interface.tools.constants import FILE_TOOLS
-from langflow.interface.vector_store.base import vectorstore_creator
-from langflow.interface.wrappers.base import wrapper_creator
+from langflow.graph.nodes import LLMNode, ToolkitNode
+from langflow.graph.registry import node_registry
 from langflow.utils import payload
+from langflow.utils.logger import logger
+
+if TYPE_CHECKING:
+    from langflow.graph.plan import ExecutionPlan
 
 
 class Graph:
@@ -40,14 +25,48 @@ class Graph:
     ) -> None:
         self._nodes = nodes
         self._edges = edges
+        self._content_hashes: Optional[Dict[str, str]] = None
+        # The id of the root node when it is known beforehand, see from_plan
+        self._root_id: Optional[str] = None
         self._build_graph()
 
+    @classmethod
+    def from_plan(cls, plan: "ExecutionPlan") -> "Graph":
+        """Create a graph from a compiled plan without parsing any template."""
+        graph = cls.__new__(cls)
+        graph._nodes = []
+        graph._edges = []
+        graph._content_hashes = None
+        graph._root_id = plan.root
+        graph.nodes = [
+            plan_node.get_node_class().from_plan(plan_node) for plan_node in plan.nodes
+        ]
+        graph._node_map = {node.id: node for node in graph.nodes}
+        for plan_node in plan.nodes:
+            node = graph._node_map[plan_node.id]
+            for key, node_ids in plan_node.node_params.items():
+                if isinstance(node_ids, list):
+                    node.params[key] = [
+                        graph._node_map[node_id] for node_id in node_ids
+                    ]
+                else:
+                    node.params[key] = graph._node_map[node_ids]
+        graph.edges = [
+            Edge(
+                graph._node_map[plan_edge.source],
+                graph._node_map[plan_edge.target],
+                matched_type=plan_edge.matched_type,
+            )
+            for plan_edge in plan.edges
+        ]
+        graph._index_edges()
+        return graph
+
     def _build_graph(self) -> None:
         self.nodes = self._build_nodes()
+        self._node_map: Dict[str, Node] = {node.id: node for node in self.nodes}
         self.edges = self._build_edges()
-        for edge in self.edges:
-            edge.source.add_edge(edge)
-            edge.target.add_edge(edge)
+        self._index_edges()
 
         # This is a hack to make sure that the LLM node is sent to
         # the toolkit node
@@ -68,40 +87,114 @@ class Graph:
             if self._validate_node(node)
             or (len(self.nodes) == 1 and len(self.edges) == 0)
         ]
+        self._node_map = {node.id: node for node in self.nodes}
+
+    def _index_edges(self) -> None:
+        # Adjacency lists keyed by node id so that lookups
+        # are O(degree) instead of a scan over every edge
+        self._incoming_edges: Dict[str, List[Edge]] = defaultdict(list)
+        self._outgoing_edges: Dict[str, List[Edge]] = defaultdict(list)
+        for edge in self.edges:
+            edge.source.add_edge(edge)
+            edge.target.add_edge(edge)
+            self._outgoing_edges[edge.source.id].append(edge)
+            self._incoming_edges[edge.target.id].append(edge)
 
     def _validate_node(self, node: Node) -> bool:
         # All nodes that do not have edges are invalid
         return len(node.edges) > 0
 
     def get_node(self, node_id: str) -> Union[None, Node]:
-        return next((node for node in self.nodes if node.id == node_id), None)
+        return self._node_map.get(node_id)
+
+    def get_incoming_edges(self, node: Node) -> List[Edge]:
+        """Edges that have the node as their target."""
+        return self._incoming_edges.get(node.id, [])
+
+    def get_outgoing_edges(self, node: Node) -> List[Edge]:
+        """Edges that have the node as their source."""
+        return self._outgoing_edges.get(node.id, [])
 
     def get_nodes_with_target(self, node: Node) -> List[Node]:
         connected_nodes: List[Node] = [
-            edge.source for edge in self.edges if edge.target == node
+            edge.source for edge in self.get_incoming_edges(node)
         ]
         return connected_nodes
 
-    def build(self) -> List[Node]:
+    def compute_content_hashes(self) -> Dict[str, str]:
+        """Get the content hash of every node by node id."""
+        if self._content_hashes is None:
+            self._content_hashes = compute_content_hashes(self.nodes)
+        return self._content_hashes
+
+    def reuse_built_objects(self, previous: "Graph") -> int:
+        """
+        Reuse the built objects of the nodes of a previous version of
+        this graph whose content hash did not change, so that only the
+        changed nodes and the nodes that depend on them are rebuilt.
+
+        Returns the number of reused nodes.
+        """
+        previous_nodes = {
+            previous_node.content_hash: previous_node
+            for previous_node in previous.nodes
+            if previous_node._built and previous_node.content_hash is not None
+        }
+        if not previous_nodes:
+            return 0
+        self.compute_content_hashes()
+        reused = 0
+        for node in self.nodes:
+            previous_node = previous_nodes.get(node.content_hash)
+            if previous_node is not None and not node._built:
+                node.reuse_built_object(previous_node)
+                reused += 1
+        logger.debug(f"Reused {reused} of {len(self.nodes)} built nodes")
+        return reused
+
+    def get_root_node(self) -> Optional[Node]:
+        """Get the node the flow is built from, the one of the plan if any."""
+        if self._root_id is not None:
+            return self._node_map[self._root_id]
+        return payload.get_root_node(self)
+
+    def build(self, parallel: Optional[bool] = None) -> List[Node]:
         # Get root node
-        root_node = payload.get_root_node(self)
+        root_node = self.get_root_node()
         if root_node is None:
             raise ValueError("No root node found")
+        # The content hashes let unchanged nodes be taken from the cache
+        self.compute_content_hashes()
+        # Build the root and its dependencies in topological order,
+        # independent nodes on a thread pool if parallel is enabled
+        build_node(root_node, parallel=parallel)
         return root_node.build()
 
+    async def abuild(self) -> List[Node]:
+        """Build the graph without blocking the event loop."""
+        root_node = self.get_root_node()
+        if root_node is None:
+            raise ValueError("No root node found")
+        self.compute_content_hashes()
+        await abuild_node(root_node)
+        # Copying the built object can be expensive too
+        return await run_in_build_executor(root_node.build)
+
     def get_node_neighbors(self, node: Node) -> Dict[Node, int]:
         neighbors: Dict[Node, int] = {}
-        for edge in self.edges:
+        for edge in self.get_outgoing_edges(node):
+            neighbor = edge.target
+            if neighbor not in neighbors:
+                neighbors[neighbor] = 0
+            neighbors[neighbor] += 1
+        for edge in self.get_incoming_edges(node):
             if edge.source == node:
-                neighbor = edge.target
-                if neighbor not in neighbors:
-                    neighbors[neighbor] = 0
-                neighbors[neighbor] += 1
-            elif edge.target == node:
-                neighbor = edge.source
-                if neighbor not in neighbors:
-                    neighbors[neighbor] = 0
-                neighbors[neighbor] += 1
+                # Self loops were already counted as outgoing edges
+                continue
+            neighbor = edge.source
+            if neighbor not in neighbors:
+                neighbors[neighbor] = 0
+            neighbors[neighbor] += 1
         return neighbors
 
     def _build_edges(self) -> List[Edge]:
@@ -120,32 +213,9 @@ class Graph:
             edges.append(Edge(source, target))
         return edges
 
-    def _get_node_class(self, node_type: str, node_lc_type: str) -> Type[Node]:
-        node_type_map: Dict[str, Type[Node]] = {
-            **{t: PromptNode for t in prompt_creator.to_list()},
-            **{t: AgentNode for t in agent_creator.to_list()},
-            **{t: ChainNode for t in chain_creator.to_list()},
-            **{t: ToolNode for t in tool_creator.to_list()},
-            **{t: ToolkitNode for t in toolkits_creator.to_list()},
-            **{t: WrapperNode for t in wrapper_creator.to_list()},
-            **{t: LLMNode for t in llm_creator.to_list()},
-            **{t: MemoryNode for t in memory_creator.to_list()},
-            **{t: EmbeddingNode for t in embedding_creator.to_list()},
-            **{t: VectorStoreNode for t in vectorstore_creator.to_list()},
-            **{t: DocumentLoaderNode for t in documentloader_creator.to_list()},
-            **{t: TextSplitterNode for t in textsplitter_creator.to_list()},
-        }
-
-        if node_type in FILE_TOOLS:
-            return FileToolNode
-        if node_type in node_type_map:
-            return node_type_map[node_type]
-        if node_lc_type in node_type_map:
-            return node_type_map[node_lc_type]
-        return Node
-
     def _build_nodes(self) -> List[Node]:
         nodes: List[Node] = []
+        node_registry.refresh()
         for node in self._nodes:
             node_data = node["data"]
             node_type: str = node_data["type"]  # type: ignore
@@ -156,6 +226,9 @@ class Graph:
 
         return nodes
 
+    def _get_node_class(self, node_type: str, node_lc_type: str) -> Type[Node]:
+        return node_registry.get_node_type_info(node_type, node_lc_type).node_class
+
     def get_children_by_node_type(self, node: Node, node_type: str) -> List[Node]:
         children = []
         node_types = [node.data["type"]]
@@ -1,42 +1,23 @@
-from copy import deepcopy
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Set
 
+from langflow.cache.documents import get_documents_backend, get_documents_key
+from langflow.cache.embeddings import cache_embeddings
+from langflow.cache.queries import cache_queries, invalidate_queries
 from langflow.graph.base import Node
 from langflow.graph.utils import extract_input_variables_from_prompt
+from langflow.utils.logger import logger
 
 
 class AgentNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="agents")
 
-        self.tools: List[ToolNode] = []
-        self.chains: List[ChainNode] = []
-
-    def _set_tools_and_chains(self) -> None:
-        for edge in self.edges:
-            source_node = edge.source
-            if isinstance(source_node, ToolNode):
-                self.tools.append(source_node)
-            elif isinstance(source_node, ChainNode):
-                self.chains.append(source_node)
-
-    def build(self, force: bool = False) -> Any:
-        if not self._built or force:
-            self._set_tools_and_chains()
-            # First, build the tools
-            for tool_node in self.tools:
-                tool_node.build()
-
-            # Next, build the chains and the rest
-            for chain_node in self.chains:
-                chain_node.build(tools=self.tools)
-
-            self._build()
-
-        #! Cannot deepcopy VectorStore, VectorStoreRouter, or SQL agents
-        if self.node_type in ["VectorStoreAgent", "VectorStoreRouterAgent", "SQLAgent"]:
-            return self._built_object
-        return deepcopy(self._built_object)
+    def get_tool_nodes(self) -> List["ToolNode"]:
+        return [
+            edge.source
+            for edge in self.edges
+            if edge.target == self and isinstance(edge.source, ToolNode)
+        ]
 
 
 class ToolNode(Node):
@@ -48,65 +29,71 @@ class PromptNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="prompts")
 
-    def build(
-        self,
-        force: bool = False,
-        tools: Optional[Union[List[Node], List[ToolNode]]] = None,
-    ) -> Any:
-        if not self._built or force:
-            if (
-                "input_variables" not in self.params
-                or self.params["input_variables"] is None
-            ):
-                self.params["input_variables"] = []
-            # Check if it is a ZeroShotPrompt and needs a tool
-            if "ShotPrompt" in self.node_type:
-                tools = (
-                    [tool_node.build() for tool_node in tools]
-                    if tools is not None
-                    else []
-                )
-                self.params["tools"] = tools
-                prompt_params = [
-                    key
-                    for key, value in self.params.items()
-                    if isinstance(value, str) and key != "format_instructions"
-                ]
-            else:
-                prompt_params = ["template"]
-            for param in prompt_params:
-                prompt_text = self.params[param]
-                variables = extract_input_variables_from_prompt(prompt_text)
-                self.params["input_variables"].extend(variables)
-            self.params["input_variables"] = list(set(self.params["input_variables"]))
-
-            self._build()
-        return deepcopy(self._built_object)
+    def get_tool_nodes(self) -> List[ToolNode]:
+        """
+        Get the tools of the agents that use this prompt through a chain.
+        A ZeroShotPrompt needs them to be built.
+        """
+        if "ShotPrompt" not in self.node_type:
+            return []
+        # Tools that depend on this prompt (e.g. an agent used as a tool
+        # that shares the chain) would create a cycle, so they are skipped
+        downstream = self._get_downstream_ids()
+        tool_nodes: List[ToolNode] = []
+        for edge in self.edges:
+            chain_node = edge.target
+            if edge.source != self or not isinstance(chain_node, ChainNode):
+                continue
+            for chain_edge in chain_node.edges:
+                agent_node = chain_edge.target
+                if chain_edge.source == chain_node and isinstance(
+                    agent_node, AgentNode
+                ):
+                    tool_nodes.extend(
+                        tool_node
+                        for tool_node in agent_node.get_tool_nodes()
+                        if tool_node.id not in downstream
+                        and tool_node not in tool_nodes
+                    )
+        return tool_nodes
+
+    def _get_downstream_ids(self) -> Set[str]:
+        downstream: Set[str] = set()
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            for edge in node.edges:
+                if edge.source == node and edge.target.id not in downstream:
+                    downstream.add(edge.target.id)
+                    stack.append(edge.target)
+        return downstream
+
+    def get_dependencies(self) -> List[Node]:
+        return super().get_dependencies() + self.get_tool_nodes()
+
+    def _prepare_params(self, params: Dict) -> None:
+        params["input_variables"] = list(params.get("input_variables") or [])
+        # Check if it is a ZeroShotPrompt and needs a tool
+        if "ShotPrompt" in self.node_type:
+            params["tools"] = [tool_node.build() for tool_node in self.get_tool_nodes()]
+            prompt_params = [
+                key
+                for key, value in params.items()
+                if isinstance(value, str) and key != "format_instructions"
+            ]
+        else:
+            prompt_params = ["template"]
+        for param in prompt_params:
+            prompt_text = params[param]
+            variables = extract_input_variables_from_prompt(prompt_text)
+            params["input_variables"].extend(variables)
+        params["input_variables"] = list(set(params["input_variables"]))
 
 
 class ChainNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="chains")
 
-    def build(
-        self,
-        force: bool = False,
-        tools: Optional[Union[List[Node], List[ToolNode]]] = None,
-    ) -> Any:
-        if not self._built or force:
-            # Check if the chain requires a PromptNode
-            for key, value in self.params.items():
-                if isinstance(value, PromptNode):
-                    # Build the PromptNode, passing the tools if available
-                    self.params[key] = value.build(tools=tools, force=force)
-
-            self._build()
-
-        #! Cannot deepcopy SQLDatabaseChain
-        if self.node_type in ["SQLDatabaseChain"]:
-            return self._built_object
-        return deepcopy(self._built_object)
-
 
 class LLMNode(Node):
     def __init__(self, data: Dict):
@@ -127,18 +114,37 @@ class WrapperNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="wrappers")
 
-    def build(self, force: bool = False) -> Any:
-        if not self._built or force:
-            if "headers" in self.params:
-                self.params["headers"] = eval(self.params["headers"])
-            self._build()
-        return deepcopy(self._built_object)
+    def _prepare_params(self, params: Dict) -> None:
+        if isinstance(params.get("headers"), str):
+            params["headers"] = eval(params["headers"])
 
 
 class DocumentLoaderNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="documentloaders")
 
+    def _build(self):
+        # Parsing the files again is slow, the documents are cached by
+        # the loader, its params and the content of the files
+        backend = get_documents_backend()
+        try:
+            key = get_documents_key(
+                self._get_class_object(), self.params, self._file_digests
+            )
+        except Exception:
+            key = None
+        if backend is None or key is None:
+            super()._build()
+            return
+
+        documents = backend.get(key)
+        if documents is not None:
+            logger.debug(f"Reusing the documents of {self.node_type}")
+            self._set_built_object(documents)
+            return
+        super()._build()
+        backend.set(key, self._built_object)
+
     def _built_object_repr(self):
         # This built_object is a list of documents. Maybe we should
         # show how many documents are in the list?
@@ -152,11 +158,21 @@ class EmbeddingNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="embeddings")
 
+    def _set_built_object(self, built_object: Any) -> None:
+        # The vector stores built with it reuse the embeddings of their documents
+        super()._set_built_object(cache_embeddings(built_object))
+
 
 class VectorStoreNode(Node):
     def __init__(self, data: Dict):
         super().__init__(data, base_type="vectorstores")
 
+    def _set_built_object(self, built_object: Any) -> None:
+        if self._built_object is not None and self._built_object is not built_object:
+            # The results of the previous store are stale
+            invalidate_queries(self._built_object)
+        super()._set_built_object(cache_queries(built_object))
+
     def _built_object_repr(self):
         return "Vector stores can take time to build. It will build on the first query."
 
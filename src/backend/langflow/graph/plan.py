@@ -0,0 +1,205 @@
+# Description: Compiled execution plan of a flow
+# Insights:
+#   - Parse the templates and validate the edges once, when the flow is compiled
+#   - Store the node types, the literal params and the wiring
+#   - The plan is plain JSON, so it can be saved to disk and loaded anywhere
+#   - Classes are resolved from the node types by the registry, never from
+#     import paths in the plan, so a plan can't point to any importable object
+#   - A redacted plan has no secrets nor file contents, they are restored
+#     from the flow it was compiled from, so it can be stored in shared caches
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from langflow.graph.base import Node
+from langflow.graph.engine import collect_dependencies
+from langflow.graph.graph import Graph
+from langflow.graph.registry import NODE_CLASS_BASE_TYPES
+from langflow.utils import payload
+
+PLAN_VERSION = 2
+
+# Fields whose name contains one of these are secrets, as in the templates
+SECRET_FIELD_NAMES = {"password", "token", "api", "key"}
+
+NODE_CLASSES: Dict[str, Type[Node]] = {
+    node_class.__name__: node_class for node_class in [Node, *NODE_CLASS_BASE_TYPES]
+}
+
+
+class PlanFile(BaseModel):
+    """A file uploaded to a node, kept so that the plan is self-contained."""
+
+    name: str
+    suffixes: List[str]
+    content: str
+    digest: str
+
+
+class PlanNode(BaseModel):
+    id: str
+    node_class: str
+    node_type: str
+    base_type: Optional[str]
+    output: List[str]
+    # Params that are values, params that point to other nodes and files
+    params: Dict[str, Any] = {}
+    node_params: Dict[str, Union[str, List[str]]] = {}
+    files: Dict[str, PlanFile] = {}
+    # Params that are removed from a redacted plan
+    secrets: List[str] = []
+
+    def get_node_class(self) -> Type[Node]:
+        if self.node_class not in NODE_CLASSES:
+            raise ValueError(f"Unknown node class {self.node_class}")
+        return NODE_CLASSES[self.node_class]
+
+
+class PlanEdge(BaseModel):
+    source: str
+    target: str
+    matched_type: str
+
+
+class ExecutionPlan(BaseModel):
+    """A flow compiled into what is needed to build it."""
+
+    plan_version: int = PLAN_VERSION
+    nodes: List[PlanNode]
+    edges: List[PlanEdge]
+    root: Optional[str]
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> "ExecutionPlan":
+        """Compile a graph created from a flow."""
+        # Keep the order of the graph, it decides which node is the root
+        node_ids = {node.id for node in graph.nodes}
+        nodes = graph.nodes + [
+            node
+            for node in collect_dependencies(graph.nodes)
+            if node.id not in node_ids
+        ]
+        node_ids = {node.id for node in nodes}
+        # The content of the uploaded files is only in the flow data
+        raw_nodes = {node["id"]: node for node in graph._nodes}
+        root = payload.get_root_node(graph)
+        return cls(
+            nodes=[_compile_node(node, raw_nodes.get(node.id)) for node in nodes],
+            edges=[
+                PlanEdge(
+                    source=edge.source.id,
+                    target=edge.target.id,
+                    matched_type=edge.matched_type,
+                )
+                for edge in graph.edges
+                if edge.source.id in node_ids and edge.target.id in node_ids
+            ],
+            root=root.id if root is not None else None,
+        )
+
+    @classmethod
+    def parse_plan(cls, data: Dict) -> "ExecutionPlan":
+        """Load a plan checking that it was compiled with this version."""
+        version = data.get("plan_version")
+        if version != PLAN_VERSION:
+            raise ValueError(
+                f"Execution plan version {version} is not supported, "
+                f"expected {PLAN_VERSION}. Please, compile the flow again."
+            )
+        return cls.parse_obj(data)
+
+    @staticmethod
+    def is_plan(data: Dict) -> bool:
+        return isinstance(data, dict) and "plan_version" in data
+
+    def save(self, path: Union[str, Path]) -> None:
+        Path(path).write_text(self.json(), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ExecutionPlan":
+        return cls.parse_plan(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def to_graph(self) -> Graph:
+        return Graph.from_plan(self)
+
+    def redact(self) -> "ExecutionPlan":
+        """Copy the plan without the secrets and the contents of the files."""
+        plan = self.copy(deep=True)
+        for plan_node in plan.nodes:
+            for key in plan_node.secrets:
+                plan_node.params.pop(key, None)
+            for plan_file in plan_node.files.values():
+                plan_file.content = ""
+        return plan
+
+    def restore(self, data_graph: Dict) -> "ExecutionPlan":
+        """Copy a redacted plan with the secrets and files of its flow."""
+        raw_nodes = {node["id"]: node for node in data_graph["nodes"]}
+        plan = self.copy(deep=True)
+        for plan_node in plan.nodes:
+            if not plan_node.secrets and not plan_node.files:
+                continue
+            if plan_node.id not in raw_nodes:
+                raise ValueError(f"Node {plan_node.id} is not in the flow")
+            template = raw_nodes[plan_node.id]["data"]["node"]["template"]
+            for key in plan_node.secrets:
+                plan_node.params[key] = template[key]["value"]
+            for key, plan_file in plan_node.files.items():
+                plan_file.content = template[key]["content"]
+        return plan
+
+
+def compile_flow(data_graph: Dict) -> ExecutionPlan:
+    """Compile the nodes and edges of a flow into an execution plan."""
+    graph = Graph(data_graph["nodes"], data_graph["edges"])
+    return ExecutionPlan.from_graph(graph)
+
+
+def _is_secret(key: str, field: Any) -> bool:
+    if isinstance(field, dict) and field.get("password"):
+        return True
+    return any(name in key.lower() for name in SECRET_FIELD_NAMES)
+
+
+def _compile_node(node: Node, raw_node: Optional[Dict]) -> PlanNode:
+    params: Dict[str, Any] = {}
+    node_params: Dict[str, Union[str, List[str]]] = {}
+    files: Dict[str, PlanFile] = {}
+    secrets: List[str] = []
+    template = raw_node["data"]["node"]["template"] if raw_node else {}
+    for key, value in node.params.items():
+        if isinstance(value, Node):
+            node_params[key] = value.id
+        elif (
+            isinstance(value, list)
+            and value
+            and all(isinstance(item, Node) for item in value)
+        ):
+            node_params[key] = [item.id for item in value]
+        elif key in node._file_digests:
+            field = template[key]
+            files[key] = PlanFile(
+                name=field["value"],
+                suffixes=field["suffixes"],
+                content=field["content"],
+                digest=node._file_digests[key],
+            )
+        else:
+            params[key] = value
+            if isinstance(value, str) and _is_secret(key, template.get(key)):
+                secrets.append(key)
+
+    return PlanNode(
+        id=node.id,
+        node_class=type(node).__name__,
+        node_type=node.node_type,
+        base_type=node.base_type,
+        output=node.output,
+        params=params,
+        node_params=node_params,
+        files=files,
+        secrets=secrets,
+    )
@@ -0,0 +1,165 @@
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Type
+
+from langflow.graph.base import Node
+from langflow.graph.nodes import (
+    AgentNode,
+    ChainNode,
+    DocumentLoaderNode,
+    EmbeddingNode,
+    FileToolNode,
+    LLMNode,
+    MemoryNode,
+    PromptNode,
+    TextSplitterNode,
+    ToolkitNode,
+    ToolNode,
+    VectorStoreNode,
+    WrapperNode,
+)
+from langflow.interface.agents.base import agent_creator
+from langflow.interface.agents.custom import CUSTOM_AGENTS
+from langflow.interface.chains.base import chain_creator
+from langflow.interface.document_loaders.base import documentloader_creator
+from langflow.interface.embeddings.base import embedding_creator
+from langflow.interface.importing.utils import import_by_type
+from langflow.interface.listing import get_all_types_dict
+from langflow.interface.llms.base import llm_creator
+from langflow.interface.memories.base import memory_creator
+from langflow.interface.prompts.base import prompt_creator
+from langflow.interface.text_splitters.base import textsplitter_creator
+from langflow.interface.toolkits.base import toolkits_creator
+from langflow.interface.tools.base import tool_creator
+from langflow.interface.tools.constants import FILE_TOOLS
+from langflow.interface.vector_store.base import vectorstore_creator
+from langflow.interface.wrappers.base import wrapper_creator
+from langflow.settings import settings
+
+# The order matters: later creators override earlier ones
+# when a type is listed by more than one of them
+NODE_CLASS_CREATORS = [
+    (PromptNode, prompt_creator),
+    (AgentNode, agent_creator),
+    (ChainNode, chain_creator),
+    (ToolNode, tool_creator),
+    (ToolkitNode, toolkits_creator),
+    (WrapperNode, wrapper_creator),
+    (LLMNode, llm_creator),
+    (MemoryNode, memory_creator),
+    (EmbeddingNode, embedding_creator),
+    (VectorStoreNode, vectorstore_creator),
+    (DocumentLoaderNode, documentloader_creator),
+    (TextSplitterNode, textsplitter_creator),
+]
+
+NODE_CLASS_BASE_TYPES: Dict[Type[Node], str] = {
+    PromptNode: "prompts",
+    AgentNode: "agents",
+    ChainNode: "chains",
+    ToolNode: "tools",
+    FileToolNode: "tools",
+    ToolkitNode: "toolkits",
+    WrapperNode: "wrappers",
+    LLMNode: "llms",
+    MemoryNode: "memory",
+    EmbeddingNode: "embeddings",
+    VectorStoreNode: "vectorstores",
+    DocumentLoaderNode: "documentloaders",
+    TextSplitterNode: "textsplitters",
+}
+
+
+class NodeTypeInfo(NamedTuple):
+    """What graph construction needs to know about a node type."""
+
+    node_class: Type[Node]
+    base_type: Optional[str]
+
+
+class NodeTypeRegistry:
+    """
+    Index of every component type, built once from the creators and
+    rebuilt only when the settings change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[Tuple] = None
+        self._node_types: Dict[str, NodeTypeInfo] = {}
+        self._base_types: Dict[str, str] = {}
+        self._import_targets: Dict[Tuple[str, str], Any] = {}
+
+    @staticmethod
+    def _settings_fingerprint() -> Tuple:
+        return tuple(
+            (key, tuple(value) if isinstance(value, list) else value)
+            for key, value in settings.dict().items()
+        )
+
+    def refresh(self) -> None:
+        """Rebuild the index if the settings changed since it was built."""
+        fingerprint = self._settings_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._build_index(fingerprint)
+
+    def _ensure_index(self) -> None:
+        if self._fingerprint is None:
+            self._build_index(self._settings_fingerprint())
+
+    def _build_index(self, fingerprint: Tuple) -> None:
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            node_types: Dict[str, NodeTypeInfo] = {}
+            for node_class, creator in NODE_CLASS_CREATORS:
+                info = NodeTypeInfo(node_class, NODE_CLASS_BASE_TYPES[node_class])
+                node_types.update({name: info for name in creator.to_list()})
+
+            # Node types that are not handled by a Node subclass are
+            # built by the base Node, which needs the first base type
+            # that lists them
+            base_types: Dict[str, str] = {}
+            for base_type, names in get_all_types_dict().items():
+                for name in names:
+                    base_types.setdefault(name, base_type)
+
+            self._node_types = node_types
+            self._base_types = base_types
+            self._import_targets = {}
+            self._fingerprint = fingerprint
+
+    def invalidate(self) -> None:
+        """Force the index to be rebuilt on the next lookup."""
+        with self._lock:
+            self._fingerprint = None
+
+    def get_node_type_info(self, node_type: str, node_lc_type: str) -> NodeTypeInfo:
+        """Get the Node class and base type for a node."""
+        self._ensure_index()
+        if node_type in FILE_TOOLS:
+            return NodeTypeInfo(FileToolNode, NODE_CLASS_BASE_TYPES[FileToolNode])
+        if node_type in self._node_types:
+            return self._node_types[node_type]
+        if node_lc_type in self._node_types:
+            return self._node_types[node_lc_type]
+        return NodeTypeInfo(Node, None)
+
+    def get_base_type(self, node_type: str) -> Optional[str]:
+        """Get the base type listing a node type, if any."""
+        self._ensure_index()
+        return self._base_types.get(node_type)
+
+    def get_import_target(self, base_type: str, node_type: str) -> Any:
+        """Get the class or function that builds a node type."""
+        self._ensure_index()
+        key = (base_type, node_type)
+        if key not in self._import_targets:
+            if node_type in CUSTOM_AGENTS:
+                target = CUSTOM_AGENTS[node_type]
+            else:
+                target = import_by_type(_type=base_type, name=node_type)
+            self._import_targets[key] = target
+        return self._import_targets[key]
+
+
+node_registry = NodeTypeRegistry()
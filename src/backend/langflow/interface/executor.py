@@ -0,0 +1,111 @@
+# Description: Thread pool for the chains that can only run synchronously
+# Insights:
+#   - A blocking chain call on the event loop stalls every other socket of
+#     the worker, so the calls run on a thread pool instead
+#   - The pool is bounded: when every thread is busy and the queue is full,
+#     new calls are rejected instead of piling up
+#   - The number of running and queued calls is reported
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from langflow.settings import settings
+
+T = TypeVar("T")
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the chain executor can't take more calls."""
+
+
+class ChainExecutor:
+    """
+    Thread pool of max_workers threads that keeps at most max_queue
+    calls waiting for a thread, no limit if max_queue is None.
+    """
+
+    def __init__(self, max_workers: int, max_queue: Optional[int] = None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="langflow-chain"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        with self._lock:
+            if (
+                self.max_queue is not None
+                and self._pending >= self.max_workers + self.max_queue
+            ):
+                self.rejected += 1
+                raise ExecutorBusyError(
+                    "The server is busy running other chains. Please, try again later."
+                )
+            self._pending += 1
+        # Keep the context, e.g. the current client, in the thread
+        context = contextvars.copy_context()
+        try:
+            return self._executor.submit(self._run, context, func, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def _run(
+        self, context: contextvars.Context, func: Callable[..., T], *args, **kwargs
+    ) -> T:
+        with self._lock:
+            self._running += 1
+        try:
+            return context.run(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking function on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_executor: Optional[ChainExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_chain_executor() -> ChainExecutor:
+    """Get the thread pool shared by every synchronous chain call."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ChainExecutor(
+                max_workers=settings.chain_workers,
+                max_queue=settings.chain_queue_size,
+            )
+        return _executor
+
+
+async def run_in_chain_executor(func: Callable[..., T], *args: Any, **kwargs) -> T:
+    return await get_chain_executor().run(func, *args, **kwargs)
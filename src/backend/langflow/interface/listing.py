@@ -31,6 +31,14 @@ def get_type_dict():
     }
 
 
+def get_all_types_dict():
+    """Langchain types and ours"""
+    return {
+        **get_type_dict(),
+        "Custom": ["Custom Tool", "Python Function"],
+    }
+
+
 LANGCHAIN_TYPES_DICT = get_type_dict()
 
 # Now we'll build a dict with Langchain types and ours
@@ -1,5 +1,5 @@
 import json
-from typing import Any, Callable, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Union
 
 from langchain.agents import ZeroShotAgent
 from langchain.agents import agent as agent_module
@@ -17,19 +17,65 @@ from langchain.base_language import BaseLanguageModel
 from langchain.callbacks.base import BaseCallbackManager
 from langchain.chains.loading import load_chain_from_config
 from langchain.llms.loading import load_llm_from_config
+from langchain.vectorstores.base import VectorStore
 from pydantic import ValidationError
 
+from langflow.cache.lru import LRUCache, register_cache
 from langflow.interface.agents.custom import CUSTOM_AGENTS
 from langflow.interface.importing.utils import import_by_type
 from langflow.interface.run import fix_memory_inputs
 from langflow.interface.toolkits.base import toolkits_creator
 from langflow.interface.types import get_type_list
 from langflow.interface.utils import load_file_into_dict
+from langflow.settings import settings
 from langflow.utils import util, validate
+from langflow.utils.logger import logger
 
+if TYPE_CHECKING:
+    from langflow.graph.plan import ExecutionPlan
 
-def instantiate_class(node_type: str, base_type: str, params: Dict) -> Any:
+
+# Built objects shared by every flow, keyed by the content hash of their node.
+# The nodes never hand out these objects, only copies made according
+# to the clone policy of their type. Bounded by get_built_object_cache
+built_object_cache = register_cache("built_objects", LRUCache())
+
+
+def get_built_object_cache() -> LRUCache:
+    """Get the cache of the built objects, bounded by the current settings."""
+    built_object_cache.configure(
+        maxsize=settings.build_cache_size,
+        ttl=settings.build_cache_ttl,
+        max_weight=settings.build_cache_max_bytes,
+    )
+    return built_object_cache
+
+
+def get_cached_object(cache_key: Optional[str]) -> Any:
+    return None if cache_key is None else get_built_object_cache().get(cache_key)
+
+
+def instantiate_class(
+    node_type: str,
+    base_type: str,
+    params: Dict,
+    class_object: Any = None,
+    cache_key: Optional[str] = None,
+) -> Any:
     """Instantiate class from module type and key, and params"""
+    cached_object = get_cached_object(cache_key)
+    if cached_object is not None:
+        logger.debug(f"Using cached {node_type}")
+        return cached_object
+    built_object = _instantiate_class(node_type, base_type, params, class_object)
+    if cache_key is not None and built_object is not None:
+        get_built_object_cache().set(cache_key, built_object)
+    return built_object
+
+
+def _instantiate_class(
+    node_type: str, base_type: str, params: Dict, class_object: Any = None
+) -> Any:
     params = convert_params_to_sets(params)
 
     if node_type in CUSTOM_AGENTS:
@@ -37,10 +83,46 @@ def instantiate_class(node_type: str, base_type: str, params: Dict) -> Any:
         if custom_agent:
             return custom_agent.initialize(**params)
 
-    class_object = import_by_type(_type=base_type, name=node_type)
+    if class_object is None:
+        class_object = import_by_type(_type=base_type, name=node_type)
     return instantiate_based_on_type(class_object, base_type, node_type, params)
 
 
+def has_async_constructor(base_type: str, class_object: Any) -> bool:
+    """Check if the class can be instantiated by awaiting a native coroutine"""
+    if base_type == "vectorstores" and class_object is not None:
+        # VectorStore.afrom_texts only raises NotImplementedError,
+        # so it has to be overridden by the vector store
+        afrom_texts = getattr(class_object, "afrom_texts", None)
+        return getattr(afrom_texts, "__func__", None) is not getattr(
+            VectorStore.afrom_texts, "__func__", None
+        )
+    return False
+
+
+async def ainstantiate_class(
+    node_type: str,
+    base_type: str,
+    params: Dict,
+    class_object: Any = None,
+    cache_key: Optional[str] = None,
+) -> Any:
+    """Instantiate class awaiting its async constructor if it has one"""
+    if not has_async_constructor(base_type, class_object):
+        return instantiate_class(
+            node_type, base_type, params, class_object, cache_key=cache_key
+        )
+    cached_object = get_cached_object(cache_key)
+    if cached_object is not None:
+        logger.debug(f"Using cached {node_type}")
+        return cached_object
+    params = convert_params_to_sets(params)
+    built_object = await ainstantiate_vectorstore(class_object, params)
+    if cache_key is not None and built_object is not None:
+        get_built_object_cache().set(cache_key, built_object)
+    return built_object
+
+
 def convert_params_to_sets(params):
     """Convert certain params to sets"""
     if "allowed_special" in params:
@@ -129,6 +211,15 @@ def instantiate_vectorstore(class_object, params):
     return class_object.from_documents(**params)
 
 
+async def ainstantiate_vectorstore(class_object, params):
+    if len(params.get("documents", [])) == 0:
+        raise ValueError(
+            "The source you provided did not load correctly or was empty."
+            "This may cause an error in the vectorstore."
+        )
+    return await class_object.afrom_documents(**params)
+
+
 def instantiate_documentloader(class_object, params):
     return class_object(**params).load()
 
@@ -145,23 +236,33 @@ def instantiate_utility(node_type, class_object, params):
     return class_object(**params)
 
 
-def load_flow_from_json(path: str, build=True):
+def load_flow_from_json(path: Union[str, "ExecutionPlan"], build=True):
     # This is done to avoid circular imports
     from langflow.graph import Graph
+    from langflow.graph.plan import ExecutionPlan
 
-    """Load flow from json file"""
-    with open(path, "r", encoding="utf-8") as f:
-        flow_graph = json.load(f)
-    data_graph = flow_graph["data"]
-    nodes = data_graph["nodes"]
-    # Substitute ZeroShotPrompt with PromptTemplate
-    # nodes = replace_zero_shot_prompt_with_prompt_template(nodes)
-    # Add input variables
-    # nodes = payload.extract_input_variables(nodes)
-
-    # Nodes, edges and root node
-    edges = data_graph["edges"]
-    graph = Graph(nodes, edges)
+    """Load flow from json file or from a compiled execution plan"""
+    if isinstance(path, ExecutionPlan):
+        flow_graph = None
+        graph = Graph.from_plan(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            flow_graph = json.load(f)
+
+    if ExecutionPlan.is_plan(flow_graph):
+        # Compiled plans are built without parsing the templates
+        graph = Graph.from_plan(ExecutionPlan.parse_plan(flow_graph))
+    elif flow_graph is not None:
+        data_graph = flow_graph["data"]
+        nodes = data_graph["nodes"]
+        # Substitute ZeroShotPrompt with PromptTemplate
+        # nodes = replace_zero_shot_prompt_with_prompt_template(nodes)
+        # Add input variables
+        # nodes = payload.extract_input_variables(nodes)
+
+        # Nodes, edges and root node
+        edges = data_graph["edges"]
+        graph = Graph(nodes, edges)
     if build:
         langchain_object = graph.build()
         if hasattr(langchain_object, "verbose"):
@@ -1,12 +1,28 @@
 import contextlib
-import io
-from typing import Any, Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 from langchain.schema import AgentAction
 
-from langflow.api.callback import AsyncStreamingLLMCallbackHandler, StreamingLLMCallbackHandler  # type: ignore
-from langflow.cache.base import compute_dict_hash, load_cache, memoize_dict
+from langflow.api.callback import (  # type: ignore
+    AsyncStreamingLLMCallbackHandler,
+    StreamingLLMCallbackHandler,
+    VerboseOutputCallbackHandler,
+)
+from langflow.cache.backends import get_cache_backend
+from langflow.cache.base import (
+    clear_old_cache_files_periodically,
+    compute_dict_hash,
+    load_cache,
+    memoize_dict,
+)
+from langflow.cache.manager import cache_manager
+from langflow.graph.engine import run_in_build_executor
 from langflow.graph.graph import Graph
+from langflow.graph.plan import PLAN_VERSION, ExecutionPlan
+from langflow.interface.executor import run_in_chain_executor
+from langflow.settings import settings
 from langflow.utils.logger import logger
 
 
@@ -29,25 +45,117 @@ def load_or_build_langchain_object(data_graph, is_first_message=False):
     Load langchain object from cache if it exists, otherwise build it.
     """
     if is_first_message:
-        build_langchain_object_with_caching.clear_cache()
+        # A new chat starts from a new object, only for this client and flow
+        build_langchain_object_with_caching.invalidate(data_graph)
     return build_langchain_object_with_caching(data_graph)
 
 
-@memoize_dict(maxsize=10)
+def get_client_id():
+    return cache_manager.current_client_id
+
+
+@memoize_dict(
+    # Read on each call, the settings may change after the import
+    maxsize=lambda: settings.build_memo_size,
+    ttl=lambda: settings.build_cache_ttl,
+    max_weight=lambda: settings.build_cache_max_bytes,
+    namespace=get_client_id,
+)
 def build_langchain_object_with_caching(data_graph):
     """
     Build langchain object from data_graph.
     """
 
     logger.debug("Building langchain object")
-    graph = build_graph(data_graph)
-    return graph.build()
+    graph = build_graph_incrementally(data_graph)
+    langchain_object = graph.build()
+    # The uploads of the flows that are not used anymore are removed
+    clear_old_cache_files_periodically()
+    return langchain_object
+
+
+async def aload_or_build_langchain_object(data_graph, is_first_message=False):
+    """
+    Load langchain object from cache if it exists, otherwise build it
+    without blocking the event loop.
+    """
+    if is_first_message:
+        # A new chat starts from a new object, only for this client and flow
+        abuild_langchain_object_with_caching.invalidate(data_graph)
+    return await abuild_langchain_object_with_caching(data_graph)
+
+
+@memoize_dict(
+    # Read on each call, the settings may change after the import
+    maxsize=lambda: settings.build_memo_size,
+    ttl=lambda: settings.build_cache_ttl,
+    max_weight=lambda: settings.build_cache_max_bytes,
+    namespace=get_client_id,
+)
+async def abuild_langchain_object_with_caching(data_graph):
+    """
+    Build langchain object from data_graph without blocking the event loop.
+    """
+    logger.debug("Building langchain object asynchronously")
+    # Compiling a large flow takes a while, it must not stall the loop
+    graph = await run_in_build_executor(build_graph_incrementally, data_graph)
+    langchain_object = await graph.abuild()
+    # The uploads of the flows that are not used anymore are removed
+    await run_in_build_executor(clear_old_cache_files_periodically)
+    return langchain_object
 
 
 def build_graph(data_graph):
+    """
+    Build the graph of a flow from its compiled plan, which is
+    compiled once and shared by the workers through the cache backend.
+    """
+    cache_backend = get_cache_backend()
+    plan_key = f"plan:{PLAN_VERSION}:{compute_dict_hash(data_graph)}"
+    plan_json = cache_backend.get(plan_key)
+    if plan_json is not None:
+        logger.debug("Loading graph from compiled plan")
+        try:
+            # The stored plan is redacted, the secrets and files are in the flow
+            plan = ExecutionPlan.parse_raw(plan_json).restore(data_graph)
+            return Graph.from_plan(plan)
+        except (KeyError, ValueError) as exc:
+            logger.debug(f"Could not load the compiled plan: {exc}")
+
     nodes = data_graph["nodes"]
     edges = data_graph["edges"]
-    return Graph(nodes, edges)
+    graph = Graph(nodes, edges)
+    with contextlib.suppress(ValueError):
+        # Flows with cycles can't be compiled, they fail when built
+        plan = ExecutionPlan.from_graph(graph)
+        cache_backend.set(plan_key, plan.redact().json())
+    return graph
+
+
+# The last graph built by each client, so that a changed flow
+# only rebuilds the nodes that changed
+LAST_GRAPHS: "OrderedDict[Optional[str], Graph]" = OrderedDict()
+MAX_LAST_GRAPHS = 10
+# Graphs are built on the thread pools, concurrently
+LAST_GRAPHS_LOCK = threading.Lock()
+
+
+def build_graph_incrementally(data_graph):
+    """
+    Build a graph that reuses the built objects of the unchanged nodes
+    of the last graph built by the current client.
+    """
+    graph = build_graph(data_graph)
+    graph.compute_content_hashes()
+    client_id = cache_manager.current_client_id
+    with LAST_GRAPHS_LOCK:
+        previous_graph = LAST_GRAPHS.pop(client_id, None)
+        LAST_GRAPHS[client_id] = graph
+        if len(LAST_GRAPHS) > MAX_LAST_GRAPHS:
+            LAST_GRAPHS.popitem(last=False)
+    if previous_graph is not None:
+        graph.reuse_built_objects(previous_graph)
+    return graph
 
 
 def build_langchain_object(data_graph):
@@ -66,6 +174,16 @@ def build_langchain_object(data_graph):
     return graph.build()
 
 
+async def abuild_langchain_object(data_graph):
+    """
+    Build langchain object from data_graph without blocking the event loop.
+    """
+
+    logger.debug("Building langchain object asynchronously")
+    graph = await run_in_build_executor(build_graph, data_graph)
+    return await graph.abuild()
+
+
 def process_graph_cached(data_graph: Dict[str, Any], message: str):
     """
     Process graph by extracting input variables and replacing ZeroShotPrompt
@@ -74,6 +192,25 @@ def process_graph_cached(data_graph: Dict[str, Any], message: str):
     # Load langchain object
     is_first_message = len(data_graph.get("chatHistory", [])) == 0
     langchain_object = load_or_build_langchain_object(data_graph, is_first_message)
+    return process_langchain_object(langchain_object, message)
+
+
+async def aprocess_graph_cached(data_graph: Dict[str, Any], message: str):
+    """
+    Same as process_graph_cached, but the graph is built
+    without blocking the event loop.
+    """
+    is_first_message = len(data_graph.get("chatHistory", [])) == 0
+    langchain_object = await aload_or_build_langchain_object(
+        data_graph, is_first_message
+    )
+    return await run_in_chain_executor(
+        process_langchain_object, langchain_object, message
+    )
+
+
+def process_langchain_object(langchain_object, message: str):
+    """Run the loaded langchain object and return the result and thought."""
     logger.debug("Loaded langchain object")
 
     if langchain_object is None:
@@ -181,8 +318,15 @@ async def get_result_and_steps(langchain_object, message: str, **kwargs):
         except Exception as exc:
             # make the error message more informative
             logger.debug(f"Error: {str(exc)}")
-            sync_callbacks = [StreamingLLMCallbackHandler(**kwargs)]
-            output = langchain_object(chat_input, callbacks=sync_callbacks)
+            # Chains without async support run on the chain thread pool,
+            # the handler is created here so its tokens are sent from this loop
+            sync_handler = StreamingLLMCallbackHandler(**kwargs)
+            try:
+                output = await run_in_chain_executor(
+                    langchain_object, chat_input, callbacks=[sync_handler]
+                )
+            finally:
+                await sync_handler.bridge.aclose()
 
         intermediate_steps = (
             output.get("intermediate_steps", []) if isinstance(output, dict) else []
@@ -224,30 +368,31 @@ def get_result_and_thought(langchain_object, message: str):
 
         fix_memory_inputs(langchain_object)
 
-        with io.StringIO() as output_buffer, contextlib.redirect_stdout(output_buffer):
-            try:
-                # if hasattr(langchain_object, "acall"):
-                #     output = await langchain_object.acall(chat_input)
-                # else:
-                output = langchain_object(chat_input)
-            except ValueError as exc:
-                # make the error message more informative
-                logger.debug(f"Error: {str(exc)}")
-                output = langchain_object.run(chat_input)
-
-            intermediate_steps = (
-                output.get("intermediate_steps", []) if isinstance(output, dict) else []
-            )
+        # The verbose output of this call only, stdout is shared by the threads
+        output_handler = VerboseOutputCallbackHandler()
+        try:
+            # if hasattr(langchain_object, "acall"):
+            #     output = await langchain_object.acall(chat_input)
+            # else:
+            output = langchain_object(chat_input, callbacks=[output_handler])
+        except ValueError as exc:
+            # make the error message more informative
+            logger.debug(f"Error: {str(exc)}")
+            output = langchain_object.run(chat_input, callbacks=[output_handler])
 
-            result = (
-                output.get(langchain_object.output_keys[0])
-                if isinstance(output, dict)
-                else output
-            )
-            if intermediate_steps:
-                thought = format_actions(intermediate_steps)
-            else:
-                thought = output_buffer.getvalue()
+        intermediate_steps = (
+            output.get("intermediate_steps", []) if isinstance(output, dict) else []
+        )
+
+        result = (
+            output.get(langchain_object.output_keys[0])
+            if isinstance(output, dict)
+            else output
+        )
+        if intermediate_steps:
+            thought = format_actions(intermediate_steps)
+        else:
+            thought = output_handler.getvalue()
 
     except Exception as exc:
         raise ValueError(f"Error: {str(exc)}") from exc
@@ -7,6 +7,8 @@ import yaml
 from langchain.base_language import BaseLanguageModel
 from PIL.Image import Image
 
+from langflow.graph.clone import ClonePolicy, clone_built_object
+
 
 def load_file_into_dict(file_path: str) -> dict:
     if not os.path.exists(file_path):
@@ -37,14 +39,26 @@ def try_setting_streaming_options(langchain_object, websocket):
     # If the LLM type is OpenAI or ChatOpenAI,
     # set streaming to True
     # First we need to find the LLM
-    llm = None
+    # The built objects are shared with other clients, so the LLM and the
+    # objects that hold it are copied before they are changed
     if hasattr(langchain_object, "llm"):
-        llm = langchain_object.llm
+        path = ["llm"]
     elif hasattr(langchain_object, "llm_chain") and hasattr(
         langchain_object.llm_chain, "llm"
     ):
-        llm = langchain_object.llm_chain.llm
-    if isinstance(llm, BaseLanguageModel):
-        llm.streaming = bool(hasattr(llm, "streaming"))
+        path = ["llm_chain", "llm"]
+    else:
+        return langchain_object
+    owners = [langchain_object]
+    for name in path:
+        owners.append(getattr(owners[-1], name))
+    llm = owners[-1]
+    if not isinstance(llm, BaseLanguageModel) or getattr(llm, "streaming", True):
+        return langchain_object
 
-    return langchain_object
+    cloned = [clone_built_object(owner, ClonePolicy.SHALLOW) for owner in owners]
+    # Bypass the validation of BaseModel assignments
+    object.__setattr__(cloned[-1], "streaming", True)
+    for owner, name, value in zip(cloned, path, cloned[1:]):
+        object.__setattr__(owner, name, value)
+    return cloned[0]
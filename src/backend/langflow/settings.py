@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import List, Optional
 
 import yaml
 from pydantic import BaseSettings, root_validator
@@ -20,6 +20,61 @@ class Settings(BaseSettings):
     textsplitters: List[str] = []
     utilities: List[str] = []
     dev: bool = False
+    # Build independent nodes of a flow on a thread pool
+    parallel_build: bool = False
+    build_workers: int = 4
+    # Number of built objects shared between flows, 0 disables the cache
+    build_cache_size: int = 128
+    # Seconds a built object is kept and estimated bytes of all of them,
+    # no limit if not set
+    build_cache_ttl: Optional[int] = None
+    build_cache_max_bytes: Optional[int] = None
+    # Number of built flows kept for all the clients together
+    build_memo_size: int = 100
+    # Where the build artifacts shared by the workers are stored:
+    # memory, filesystem or sqlite. cache_dir defaults to the temp folder
+    cache_backend: str = "memory"
+    cache_dir: Optional[str] = None
+    # Artifacts kept by each namespace of the memory backend
+    memory_cache_size: int = 10000
+    # Bounds of the files cached on disk, in bytes and seconds since last used,
+    # and how they are compressed: zlib, lzma or none if not set
+    disk_cache_max_bytes: Optional[int] = 512 * 1024 * 1024
+    disk_cache_max_age: Optional[int] = 7 * 24 * 60 * 60
+    disk_cache_compression: Optional[str] = "zlib"
+    # Where the embeddings of the documents are kept, one of the cache
+    # backends, the cache is disabled if not set. The files of the cache
+    # are only readable by their owner
+    embedding_cache_backend: Optional[str] = "sqlite"
+    # Same for the documents loaded from the uploaded files
+    document_cache_backend: Optional[str] = "filesystem"
+    # Number of query embeddings and vector store searches kept in memory,
+    # 0 disables the cache, and seconds they are kept
+    query_cache_size: int = 256
+    query_cache_ttl: Optional[int] = 10 * 60
+    # Threads for the chains that can only run synchronously and number of
+    # calls that can wait for one, no limit if not set
+    chain_workers: int = 8
+    chain_queue_size: Optional[int] = 64
+    # Streamed tokens are sent together every interval or once they reach
+    # a size in bytes, an interval of 0 sends every token on its own
+    stream_flush_interval_ms: int = 50
+    stream_flush_bytes: int = 512
+    # Tokens of a synchronous chain waiting to be sent and seconds the chain
+    # waits for room before dropping tokens when the client is slow, and
+    # seconds to wait for the queued tokens to be sent
+    stream_queue_size: int = 256
+    stream_put_timeout: float = 1.0
+    stream_flush_timeout: float = 10.0
+    # Messages and bytes kept per chat, the oldest are dropped first,
+    # messages sent on connect and seconds a disconnected chat is kept
+    chat_history_max_messages: int = 1000
+    chat_history_max_bytes: Optional[int] = 16 * 1024 * 1024
+    chat_history_page_size: int = 50
+    chat_history_idle_ttl: Optional[int] = 60 * 60
+    # Where the chat sessions are kept: memory, per worker, or sqlite,
+    # shared by the workers so that any of them can resume a session
+    session_store: str = "memory"
 
     class Config:
         validate_assignment = True
@@ -28,7 +83,7 @@ class Settings(BaseSettings):
     @root_validator(allow_reuse=True)
     def validate_lists(cls, values):
         for key, value in values.items():
-            if key != "dev" and not value:
+            if isinstance(cls.__fields__[key].default, list) and not value:
                 values[key] = []
         return values
 
@@ -45,6 +100,34 @@ class Settings(BaseSettings):
         self.textsplitters = new_settings.textsplitters or []
         self.utilities = new_settings.utilities or []
         self.dev = new_settings.dev or False
+        self.parallel_build = new_settings.parallel_build
+        self.build_workers = new_settings.build_workers
+        self.build_cache_size = new_settings.build_cache_size
+        self.build_cache_ttl = new_settings.build_cache_ttl
+        self.build_cache_max_bytes = new_settings.build_cache_max_bytes
+        self.build_memo_size = new_settings.build_memo_size
+        self.cache_backend = new_settings.cache_backend
+        self.cache_dir = new_settings.cache_dir
+        self.disk_cache_max_bytes = new_settings.disk_cache_max_bytes
+        self.disk_cache_max_age = new_settings.disk_cache_max_age
+        self.disk_cache_compression = new_settings.disk_cache_compression
+        self.memory_cache_size = new_settings.memory_cache_size
+        self.embedding_cache_backend = new_settings.embedding_cache_backend
+        self.document_cache_backend = new_settings.document_cache_backend
+        self.query_cache_size = new_settings.query_cache_size
+        self.query_cache_ttl = new_settings.query_cache_ttl
+        self.chain_workers = new_settings.chain_workers
+        self.chain_queue_size = new_settings.chain_queue_size
+        self.stream_flush_interval_ms = new_settings.stream_flush_interval_ms
+        self.stream_flush_bytes = new_settings.stream_flush_bytes
+        self.stream_queue_size = new_settings.stream_queue_size
+        self.stream_put_timeout = new_settings.stream_put_timeout
+        self.stream_flush_timeout = new_settings.stream_flush_timeout
+        self.chat_history_max_messages = new_settings.chat_history_max_messages
+        self.chat_history_max_bytes = new_settings.chat_history_max_bytes
+        self.chat_history_page_size = new_settings.chat_history_page_size
+        self.chat_history_idle_ttl = new_settings.chat_history_idle_ttl
+        self.session_store = new_settings.session_store
 
 
 def save_settings_to_yaml(settings: Settings, file_path: str):
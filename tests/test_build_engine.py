@@ -0,0 +1,194 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+from langflow.graph.engine import (
+    BuildError,
+    abuild_node,
+    build_node,
+    collect_dependencies,
+    get_build_executor,
+    sort_levels,
+)
+from langflow.settings import settings
+
+
+class FakeNode:
+    """Minimal stand-in for a Node, with explicit dependencies"""
+
+    def __init__(self, node_id, dependencies=None):
+        self.id = node_id
+        self.node_type = f"Fake{node_id}"
+        self.dependencies = dependencies or []
+        self._built = False
+
+    def get_dependencies(self):
+        return self.dependencies
+
+    def _build(self):
+        self._built = True
+        BUILT.append(self.id)
+
+    async def _abuild(self):
+        self._build()
+
+
+class BlockingNode(FakeNode):
+    """A node that waits for a barrier or an event while it is built"""
+
+    def __init__(self, node_id, dependencies=None, wait=None, error=None):
+        super().__init__(node_id, dependencies)
+        self.wait = wait
+        self.error = error
+        self.thread = None
+
+    def _build(self):
+        if self.wait is not None:
+            # Raises if the others never come, e.g. they run one at a time
+            assert self.wait.wait(timeout=5) is not False
+        self.thread = threading.current_thread().name
+        if self.error:
+            raise ValueError(self.error)
+        super()._build()
+
+
+BUILT = []
+
+
+@pytest.fixture(autouse=True)
+def clear_built():
+    BUILT.clear()
+
+
+def test_sort_levels():
+    a = FakeNode("a")
+    b = FakeNode("b")
+    c = FakeNode("c", [a, b])
+    d = FakeNode("d", [c, a])
+    levels = sort_levels([d, c, b, a])
+    assert [sorted(node.id for node in level) for level in levels] == [
+        ["a", "b"],
+        ["c"],
+        ["d"],
+    ]
+
+
+def test_sort_levels_detects_cycles():
+    a = FakeNode("a")
+    b = FakeNode("b", [a])
+    a.dependencies.append(b)
+    c = FakeNode("c", [b])
+    with pytest.raises(ValueError, match="cycle"):
+        sort_levels(collect_dependencies([c]))
+
+
+def test_build_node_builds_dependencies_first():
+    a = FakeNode("a")
+    b = FakeNode("b", [a])
+    c = FakeNode("c", [a, b])
+    unrelated = FakeNode("unrelated")
+    build_node(c)
+    assert BUILT == ["a", "b", "c"]
+    assert not unrelated._built
+
+    # Built nodes are not rebuilt unless forced
+    build_node(c)
+    assert BUILT == ["a", "b", "c"]
+    build_node(c, force=True)
+    assert BUILT == ["a", "b", "c", "c"]
+
+
+def test_build_deep_flow():
+    nodes = [FakeNode("0")]
+    for i in range(1, sys.getrecursionlimit() * 2):
+        nodes.append(FakeNode(str(i), [nodes[-1]]))
+    build_node(nodes[-1])
+    assert len(BUILT) == len(nodes)
+    assert BUILT[0] == "0"
+
+
+def test_parallel_build_of_independent_branches():
+    # The branches only get past the barrier if they run concurrently
+    barrier = threading.Barrier(3)
+    branches = [BlockingNode(f"loader{i}", wait=barrier) for i in range(3)]
+    root = FakeNode("root", branches)
+    build_node(root, parallel=True)
+    assert BUILT[-1] == "root"
+    assert all(branch._built for branch in branches)
+    assert all(branch.thread.startswith("langflow-build") for branch in branches)
+
+
+def test_build_executor_follows_the_settings(monkeypatch):
+    executor = get_build_executor()
+    assert get_build_executor() is executor
+    monkeypatch.setattr(settings, "build_workers", executor._max_workers + 1)
+    resized_executor = get_build_executor()
+    assert resized_executor is not executor
+    assert resized_executor._max_workers == settings.build_workers
+
+
+def test_parallel_build_reports_every_error():
+    ok = BlockingNode("ok")
+    first = BlockingNode("first", error="first failed")
+    second = BlockingNode("second", error="second failed")
+    root = FakeNode("root", [ok, first, second])
+    with pytest.raises(BuildError) as exc_info:
+        build_node(root, parallel=True)
+    assert set(exc_info.value.errors) == {"first", "second"}
+    assert "first failed" in str(exc_info.value)
+    assert ok._built
+    assert not root._built
+
+
+class AsyncBlockingNode(BlockingNode):
+    async def _abuild(self):
+        # Blocking constructors are run in a thread
+        await asyncio.get_running_loop().run_in_executor(None, self._build)
+
+
+class CountingNode(AsyncBlockingNode):
+    """Records how many nodes were being built at the same time"""
+
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def _build(self):
+        with self.lock:
+            CountingNode.running += 1
+            CountingNode.max_running = max(CountingNode.max_running, self.running)
+        try:
+            super()._build()
+        finally:
+            with self.lock:
+                CountingNode.running -= 1
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_abuild_node_follows_the_parallel_setting(parallel, monkeypatch):
+    monkeypatch.setattr(settings, "parallel_build", parallel)
+    CountingNode.max_running = 0
+    # Built concurrently, the branches get past the barrier together
+    barrier = threading.Barrier(3) if parallel else None
+    branches = [CountingNode(f"loader{i}", wait=barrier) for i in range(3)]
+    asyncio.run(abuild_node(FakeNode("root", branches)))
+    assert BUILT[-1] == "root"
+    assert CountingNode.max_running == (3 if parallel else 1)
+
+
+def test_abuild_node_does_not_block_the_event_loop():
+    # The nodes are released by the loop, which must keep running for it
+    release = threading.Event()
+    branches = [AsyncBlockingNode(f"loader{i}", wait=release) for i in range(3)]
+    root = FakeNode("root", branches)
+
+    async def release_nodes():
+        await asyncio.sleep(0)
+        release.set()
+
+    async def main():
+        await asyncio.gather(abuild_node(root), release_nodes())
+
+    asyncio.run(main())
+    assert BUILT[-1] == "root"
@@ -1,11 +1,56 @@
+import asyncio
+import base64
+import contextvars
+import copy
+import gc
+import hashlib
 import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest.mock import patch
 
+import dill  # type: ignore
 import pytest
+from langchain.chains.base import Chain
+from langchain.document_loaders import TextLoader
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langflow.cache.backends import CACHE_BACKENDS, get_cache_backend
+from langflow.cache.base import (
+    CLEANUP_INTERVAL,
+    clear_old_cache_files_periodically,
+    compute_dict_hash,
+    filter_json,
+    get_blob_store,
+    get_content_digest,
+    load_cache,
+    normalize_flow,
+    save_cache,
+)
+from langflow.cache.blobs import BlobStore
+from langflow.cache.disk import DiskCache
+from langflow.cache.embeddings import CachedEmbeddings, cache_embeddings
+from langflow.cache.lru import CACHES, LRUCache, estimate_size, register_cache
+from langflow.cache.manager import cache_manager
+from langflow.cache.queries import get_query_cache, get_query_cache_id
+from langflow.graph.graph import Graph
+from langflow.graph.nodes import DocumentLoaderNode, VectorStoreNode
+from langflow.graph.plan import PLAN_VERSION
+from langflow.interface.loading import built_object_cache, get_built_object_cache
 from langflow.interface.run import (
+    LAST_GRAPHS,
+    MAX_LAST_GRAPHS,
+    abuild_langchain_object_with_caching,
+    aload_or_build_langchain_object,
     build_graph,
+    build_graph_incrementally,
     build_langchain_object_with_caching,
     load_or_build_langchain_object,
 )
+from langflow.settings import settings
 
 
 def get_graph(_type="basic"):
@@ -60,6 +105,38 @@ def test_build_langchain_object_with_caching(basic_data_graph):
     assert graph is not None
 
 
+# Test aload_or_build_langchain_object
+def test_aload_or_build_langchain_object(complex_data_graph):
+    async def load_twice():
+        first = await aload_or_build_langchain_object(
+            complex_data_graph, is_first_message=True
+        )
+        second = await aload_or_build_langchain_object(
+            complex_data_graph, is_first_message=False
+        )
+        return first, second
+
+    first, second = asyncio.run(load_twice())
+    assert isinstance(first, Chain)
+    assert second is first
+    assert len(abuild_langchain_object_with_caching.cache) == 1
+
+
+def test_abuild_compiles_the_graph_off_the_loop(basic_data_graph):
+    abuild_langchain_object_with_caching.clear_cache()
+    threads = []
+
+    def build_graph_in_thread(data_graph):
+        threads.append(threading.current_thread())
+        return build_graph_incrementally(data_graph)
+
+    with patch(
+        "langflow.interface.run.build_graph_incrementally", build_graph_in_thread
+    ):
+        asyncio.run(abuild_langchain_object_with_caching(basic_data_graph))
+    assert threads and threads[0] is not threading.main_thread()
+
+
 # Test build_graph
 def test_build_graph(basic_data_graph):
     graph = build_graph(basic_data_graph)
@@ -68,8 +145,49 @@ def test_build_graph(basic_data_graph):
     assert len(graph.edges) == len(basic_data_graph["edges"])
 
 
+def test_build_graph_incrementally_from_threads(basic_data_graph):
+    def build(index):
+        with cache_manager.set_client_id(f"client{index % 12}"):
+            return build_graph_incrementally(copy.deepcopy(basic_data_graph))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        graphs = list(executor.map(build, range(48)))
+    assert len(graphs) == 48
+    assert len(LAST_GRAPHS) == MAX_LAST_GRAPHS
+
+
+def test_build_graph_incrementally(basic_data_graph):
+    graph = build_graph_incrementally(basic_data_graph)
+    graph.build()
+    same_graph = build_graph_incrementally(copy.deepcopy(basic_data_graph))
+    assert same_graph.compute_content_hashes() == graph.compute_content_hashes()
+    assert all(node._built for node in same_graph.nodes)
+
+    # Changing the memory rebuilds the memory and the chain, not the LLM
+    changed_data_graph = copy.deepcopy(basic_data_graph)
+    memory = next(
+        node
+        for node in changed_data_graph["nodes"]
+        if node["data"]["type"] == "ConversationBufferMemory"
+    )
+    memory["data"]["node"]["template"]["human_prefix"]["value"] = "User"
+    changed_graph = build_graph_incrementally(changed_data_graph)
+    built = {node.node_type: node._built for node in changed_graph.nodes}
+    assert built == {
+        "TimeTravelGuideChain": False,
+        "OpenAI": True,
+        "ConversationBufferMemory": False,
+    }
+    llm_node = changed_graph.get_node("dndnode_82")
+    assert llm_node._built_object is graph.get_node("dndnode_82")._built_object
+    chain = changed_graph.build()
+    assert chain.memory.human_prefix == "User"
+
+
 # Test cache size limit
-def test_cache_size_limit(basic_data_graph):
+def test_cache_size_limit(basic_data_graph, monkeypatch):
+    # The size is read on each call, not when the function is decorated
+    monkeypatch.setattr(settings, "build_memo_size", 10)
     build_langchain_object_with_caching.clear_cache()
     for i in range(11):
         modified_data_graph = basic_data_graph.copy()
@@ -82,3 +200,518 @@ def test_cache_size_limit(basic_data_graph):
         build_langchain_object_with_caching(modified_data_graph_new_id)
 
     assert len(build_langchain_object_with_caching.cache) == 10
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used item
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("b", "missing") == "missing"
+    assert len(cache) == 2
+
+
+def test_lru_cache_configure():
+    cache = LRUCache(maxsize=3)
+    for key in "abc":
+        cache.set(key, key * 100)
+    cache.configure(maxsize=2)
+    assert cache.keys() == ["b", "c"]
+    # The items are weighed once the weight is bounded
+    cache.configure(maxsize=2, max_weight=estimate_size("c" * 100))
+    assert cache.keys() == ["c"]
+    cache.configure(maxsize=0)
+    assert len(cache) == 0
+
+
+def test_caches_follow_the_settings(monkeypatch):
+    monkeypatch.setattr(settings, "build_cache_size", 3)
+    monkeypatch.setattr(settings, "query_cache_size", 4)
+    monkeypatch.setattr(settings, "query_cache_ttl", 5)
+    assert get_built_object_cache().maxsize == 3
+    assert get_query_cache().maxsize == 4
+    assert get_query_cache().ttl == 5
+
+
+def test_built_object_cache(basic_data_graph):
+    built_object_cache.clear()
+    first_graph = build_graph(basic_data_graph)
+    first_graph.build()
+    second_graph = build_graph(copy.deepcopy(basic_data_graph))
+    second_graph.build()
+    for node in second_graph.nodes:
+        first_node = first_graph.get_node(node.id)
+        assert node._built_object is first_node._built_object
+    # The shared objects are still copied by the nodes
+    assert second_graph.build() is not first_graph.build()
+    assert len(built_object_cache) == len(basic_data_graph["nodes"])
+
+
+def test_compute_dict_hash_with_files(openapi_data_graph):
+    with patch("langflow.cache.base.normalize_flow", wraps=normalize_flow) as normalize:
+        graph_hash = compute_dict_hash(openapi_data_graph)
+        # The same request is hashed once
+        assert compute_dict_hash(openapi_data_graph) == graph_hash
+        assert normalize.call_count == 1
+    assert compute_dict_hash(copy.deepcopy(openapi_data_graph)) == graph_hash
+
+    changed_data_graph = copy.deepcopy(openapi_data_graph)
+    file_field = next(
+        value
+        for node in changed_data_graph["nodes"]
+        for value in node["data"]["node"]["template"].values()
+        if isinstance(value, dict) and value.get("type") == "file"
+    )
+    content = file_field["content"]
+    assert get_content_digest(content) in str(normalize_flow(openapi_data_graph))
+    file_field["content"] = content + "IA=="
+    assert compute_dict_hash(changed_data_graph) != graph_hash
+
+
+def test_file_content_is_hashed_once_per_build(openapi_data_graph):
+    build_langchain_object_with_caching.clear_cache()
+    content = next(
+        value["content"]
+        for node in openapi_data_graph["nodes"]
+        for value in node["data"]["node"]["template"].values()
+        if isinstance(value, dict) and value.get("type") == "file"
+    )
+    sha256 = hashlib.sha256
+    hashed = []
+
+    def counting_sha256(data=b""):
+        hashed.append(data)
+        return sha256(data)
+
+    with patch("langflow.cache.base.hashlib.sha256", counting_sha256):
+        contextvars.copy_context().run(
+            build_langchain_object_with_caching, openapi_data_graph
+        )
+    assert hashed.count(content.encode("utf-8")) == 1
+
+
+class Payload(dict):
+    """A flow that can be referenced weakly."""
+
+
+def test_hashed_flows_are_released_with_the_request(basic_data_graph):
+    payload = Payload(copy.deepcopy(basic_data_graph))
+    # Each request runs in its own context
+    contextvars.copy_context().run(compute_dict_hash, payload)
+    payload_ref = weakref.ref(payload)
+    del payload
+    gc.collect()
+    assert payload_ref() is None
+
+
+def test_normalize_flow(complex_data_graph):
+    original = copy.deepcopy(complex_data_graph)
+    graph_hash = compute_dict_hash(complex_data_graph)
+    # Neither hashing nor filtering modify the flow
+    filter_json(complex_data_graph)
+    assert complex_data_graph == original
+
+    # Cosmetic changes don't change the hash
+    cosmetic_data_graph = copy.deepcopy(complex_data_graph)
+    for node in cosmetic_data_graph["nodes"]:
+        node["data"]["node"]["description"] = "Changed"
+        for field in node["data"]["node"]["template"].values():
+            if isinstance(field, dict):
+                field["show"] = not field.get("show")
+                field["display_name"] = "Changed"
+    assert normalize_flow(cosmetic_data_graph) == normalize_flow(complex_data_graph)
+    assert compute_dict_hash(cosmetic_data_graph) == graph_hash
+
+    # The order of the nodes does, it decides which node is the root
+    reordered_data_graph = copy.deepcopy(complex_data_graph)
+    reordered_data_graph["nodes"].reverse()
+    assert compute_dict_hash(reordered_data_graph) != graph_hash
+
+    # Values do
+    changed_data_graph = copy.deepcopy(complex_data_graph)
+    field = next(
+        field
+        for node in changed_data_graph["nodes"]
+        for field in node["data"]["node"]["template"].values()
+        if isinstance(field, dict) and isinstance(field.get("value"), str)
+    )
+    field["value"] += " changed"
+    assert compute_dict_hash(changed_data_graph) != graph_hash
+
+
+def test_lru_cache_ttl_and_weight():
+    cache = LRUCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+    cache = LRUCache(maxsize=10, max_weight=10, weigh=len)
+    cache.set("a", "x" * 6)
+    cache.set("b", "x" * 6)
+    assert "a" not in cache
+    # Items heavier than the budget are not cached
+    cache.set("c", "x" * 11)
+    assert "c" not in cache
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["weight"] == 6
+
+
+def test_register_cache_rejects_duplicate_names():
+    cache = register_cache("test_register_cache", LRUCache(maxsize=1))
+    # Registering the same cache again is fine
+    assert register_cache("test_register_cache", cache) is cache
+    with pytest.raises(ValueError, match="already registered"):
+        register_cache("test_register_cache", LRUCache(maxsize=1))
+    other_cache = LRUCache(maxsize=1)
+    register_cache("test_register_cache", other_cache, replace=True)
+    assert CACHES["test_register_cache"] is other_cache
+    del CACHES["test_register_cache"]
+
+
+def test_lru_cache_single_flight():
+    cache = LRUCache()
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: cache.get_or_set("a", build), range(4)))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+    async def abuild():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return object()
+
+    async def build_concurrently():
+        return await asyncio.gather(*(cache.aget_or_set("b", abuild) for _ in range(4)))
+
+    results = asyncio.run(build_concurrently())
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["hits"] == 6
+    assert cache.stats()["misses"] == 2
+
+
+def test_build_cache_namespaced_by_client(basic_data_graph):
+    build_langchain_object_with_caching.clear_cache()
+    with cache_manager.set_client_id("client1"):
+        first = load_or_build_langchain_object(basic_data_graph, is_first_message=True)
+        assert load_or_build_langchain_object(basic_data_graph) is first
+    with cache_manager.set_client_id("client2"):
+        # The first message of another client doesn't evict the first one
+        second = load_or_build_langchain_object(basic_data_graph, is_first_message=True)
+        assert second is not first
+    assert len(build_langchain_object_with_caching.cache) == 2
+    with cache_manager.set_client_id("client1"):
+        assert load_or_build_langchain_object(basic_data_graph) is first
+
+    build_langchain_object_with_caching.clear_namespace("client1")
+    assert len(build_langchain_object_with_caching.cache) == 1
+
+
+@pytest.mark.parametrize("backend_name", ["memory", "filesystem", "sqlite"])
+def test_cache_backends(backend_name, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_backend", backend_name)
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    backend = get_cache_backend()
+    assert isinstance(backend, CACHE_BACKENDS[backend_name])
+    assert backend.get("key") is None
+    backend.set("key", {"documents": ["a", "b"]})
+    assert "key" in backend
+    assert backend.get("key") == {"documents": ["a", "b"]}
+    if backend_name == "filesystem":
+        # Serialized once, the disk cache stores the bytes of the backend
+        data = backend._disk_cache.get_raw("key")
+        assert dill.loads(data) == {"documents": ["a", "b"]}
+    backend.delete("key")
+    assert backend.get("key", "missing") == "missing"
+    backend.set("other", 1)
+    backend.clear()
+    assert "other" not in backend
+    if backend_name != "memory":
+        # Only the owner can read the stored artifacts
+        paths = [path for path in tmp_path.rglob("*") if path.is_file()]
+        assert paths
+        assert all(path.stat().st_mode & 0o077 == 0 for path in paths)
+
+
+def test_build_graph_from_cached_plan(openapi_data_graph):
+    get_cache_backend().clear()
+    graph = build_graph(openapi_data_graph)
+    assert "template" in graph.nodes[0].data["node"]
+    cached_graph = build_graph(copy.deepcopy(openapi_data_graph))
+    # The second graph was created from the plan, without the templates
+    assert "template" not in cached_graph.nodes[0].data["node"]
+    assert [node.id for node in cached_graph.nodes] == [node.id for node in graph.nodes]
+    assert cached_graph.compute_content_hashes() == graph.compute_content_hashes()
+
+
+def test_memory_backend_size_follows_the_settings(monkeypatch):
+    backend = get_cache_backend("test_memory_size", "memory")
+    assert backend._cache.maxsize == settings.memory_cache_size
+    monkeypatch.setattr(settings, "memory_cache_size", 3)
+    backend = get_cache_backend("test_memory_size", "memory")
+    assert backend._cache.maxsize == 3
+
+
+def test_cached_plan_has_no_secrets(openapi_data_graph):
+    get_cache_backend().clear()
+    data_graph = copy.deepcopy(openapi_data_graph)
+    for node in data_graph["nodes"]:
+        template = node["data"]["node"]["template"]
+        if "openai_api_key" in template:
+            template["openai_api_key"]["value"] = "sk-secret"
+    graph = build_graph(data_graph)
+    plan_key = f"plan:{PLAN_VERSION}:{compute_dict_hash(data_graph)}"
+    plan_json = get_cache_backend().get(plan_key)
+    assert "sk-secret" not in plan_json
+    # The key comes back from the flow
+    cached_graph = build_graph(copy.deepcopy(data_graph))
+    assert "sk-secret" in [
+        node.params.get("openai_api_key") for node in cached_graph.nodes
+    ]
+    assert cached_graph.compute_content_hashes() == graph.compute_content_hashes()
+
+
+@pytest.mark.parametrize("compression", [None, "zlib", "lzma"])
+def test_disk_cache(compression, tmp_path):
+    disk_cache = DiskCache(tmp_path, compression=compression, max_bytes=10**6)
+    disk_cache.set("key", {"value": "x" * 100})
+    assert "key" in disk_cache
+    assert disk_cache.get("key") == {"value": "x" * 100}
+    # The files are sharded by the prefix of the key hash
+    (cached_file,) = [path for path in tmp_path.glob("*/*.dill")]
+    assert cached_file.parent.name == cached_file.stem[:2]
+    assert not list(tmp_path.glob("**/*.tmp"))
+    disk_cache.delete("key")
+    assert disk_cache.get("key", "missing") == "missing"
+    assert disk_cache.total_bytes() == 0
+
+
+def test_disk_cache_eviction(tmp_path):
+    disk_cache = DiskCache(tmp_path, compression=None)
+    disk_cache.set("a", "x" * 1000)
+    disk_cache.set("b", "x" * 1000)
+    entry_bytes = disk_cache.total_bytes() // 2
+    disk_cache.get("a")
+    # "b" is the least recently used file
+    disk_cache.max_bytes = entry_bytes * 2
+    disk_cache.set("c", "x" * 1000)
+    assert "a" in disk_cache and "c" in disk_cache
+    assert "b" not in disk_cache
+
+    # Reads don't write the index
+    index_mtime = (tmp_path / "index.json").stat().st_mtime_ns
+    disk_cache.get("a")
+    assert (tmp_path / "index.json").stat().st_mtime_ns == index_mtime
+
+    disk_cache.max_age = 0
+    time.sleep(0.01)
+    disk_cache.evict()
+    assert disk_cache.total_bytes() == 0
+    assert not list(tmp_path.glob("*/*.dill"))
+
+
+def test_save_and_load_cache():
+    save_cache("test_save_and_load_cache", {"chat": ["hello"]}, True)
+    assert load_cache("test_save_and_load_cache") == {"chat": ["hello"]}
+    assert load_cache("missing_hash") is None
+
+
+def test_blob_store(tmp_path):
+    blob_store = BlobStore(tmp_path)
+    content = "data:text/csv;base64," + base64.b64encode(b"a,b\n1,2").decode()
+    digest = get_content_digest(content)
+    assert not blob_store.exists(digest, "data.csv")
+    path = blob_store.put(digest, "data.csv", content)
+    assert path.read_bytes() == b"a,b\n1,2"
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+    assert path.parent.parent.stat().st_mode & 0o777 == 0o700
+    assert blob_store.exists(digest, "data.csv")
+    # Stored files are not decoded again
+    assert blob_store.put(digest, "data.csv", "not a data url") == path
+    # The same content with another name is linked
+    other_path = blob_store.put(digest, "other.csv", "not a data url")
+    assert other_path.read_bytes() == b"a,b\n1,2"
+
+    # Another file with the same name doesn't overwrite the first one
+    other_content = "data:text/csv;base64," + base64.b64encode(b"c,d").decode()
+    other_digest = get_content_digest(other_content)
+    assert blob_store.put(other_digest, "data.csv", other_content) != path
+    assert path.read_bytes() == b"a,b\n1,2"
+
+    blob_store.acquire(digest)
+    blob_store.prune(max_age=0)
+    assert path.exists()
+    assert not blob_store.exists(other_digest, "data.csv")
+    blob_store.release(digest)
+    blob_store.prune(max_age=0)
+    assert not path.exists()
+
+
+def test_old_cache_files_are_cleared_periodically():
+    with patch("langflow.cache.base.clear_old_cache_files") as clear:
+        with patch("langflow.cache.base._cleared_at", time.monotonic()):
+            clear_old_cache_files_periodically()
+            assert not clear.called
+        with patch("langflow.cache.base._cleared_at", -CLEANUP_INTERVAL):
+            clear_old_cache_files_periodically()
+            assert clear.called
+
+
+def test_node_file_references(openapi_data_graph):
+    graph = build_graph(copy.deepcopy(openapi_data_graph))
+    node = next(node for node in graph.nodes if node._file_digests)
+    (digest,) = node._file_digests.values()
+    blob_store = get_blob_store()
+    count = blob_store.reference_count(digest)
+    assert count > 0
+    del graph, node
+    gc.collect()
+    assert blob_store.reference_count(digest) < count
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, model: str = "fake"):
+        self.model = model
+        self.openai_api_key = "secret"
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(len(self.model))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_cached_embeddings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    embeddings = CountingEmbeddings()
+    cached_embeddings = cache_embeddings(embeddings)
+    assert isinstance(cached_embeddings, CachedEmbeddings)
+    assert cached_embeddings.model == "fake"
+    texts = ["a", "bb", "a"]
+    vectors = cached_embeddings.embed_documents(texts)
+    assert vectors == embeddings.embed_documents(texts)
+    assert embeddings.embedded[:2] == ["a", "bb"]
+
+    # Rebuilding over the same documents doesn't embed them again,
+    # even with another key or from another process
+    rebuilt = CountingEmbeddings()
+    rebuilt.openai_api_key = "rotated"
+    assert cache_embeddings(rebuilt).embed_documents(texts + ["ccc"]) == [
+        *vectors,
+        [3.0, 4.0],
+    ]
+    assert rebuilt.embedded == ["ccc"]
+
+    # Another model doesn't get the same vectors
+    other = CountingEmbeddings(model="other")
+    cache_embeddings(other).embed_documents(texts)
+    assert other.embedded == ["a", "bb"]
+
+    monkeypatch.setattr(settings, "embedding_cache_backend", None)
+    assert cache_embeddings(embeddings) is embeddings
+
+
+def test_document_loader_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    loads = []
+    load = TextLoader.load
+
+    def counting_load(self):
+        loads.append(self.file_path)
+        return load(self)
+
+    monkeypatch.setattr(TextLoader, "load", counting_load)
+    content = base64.b64encode(b"Some text").decode()
+    data = {
+        "id": "TextLoader-1",
+        "data": {
+            "type": "TextLoader",
+            "node": {
+                "base_classes": ["BaseLoader"],
+                "template": {
+                    "_type": "TextLoader",
+                    "file_path": {
+                        "type": "file",
+                        "required": True,
+                        "list": False,
+                        "value": "text.txt",
+                        "suffixes": [".txt"],
+                        "content": f"data:text/plain;base64,{content}",
+                    },
+                },
+            },
+        },
+    }
+    documents = Graph([copy.deepcopy(data)], []).nodes[0].build()
+    assert documents[0].page_content == "Some text"
+    assert len(loads) == 1
+
+    # A new process reuses the parsed documents
+    built_object_cache.clear()
+    node = Graph([copy.deepcopy(data)], []).nodes[0]
+    assert isinstance(node, DocumentLoaderNode)
+    assert node.build() == documents
+    assert len(loads) == 1
+
+
+class CountingVectorStore:
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs):
+        self.queries.append(query)
+        return [
+            Document(page_content=f"{query} {index}", metadata=filter or {})
+            for index in range(k)
+        ]
+
+
+def test_query_cache():
+    node = VectorStoreNode(
+        {
+            "id": "Chroma-1",
+            "data": {
+                "type": "Chroma",
+                "node": {"base_classes": ["VectorStore"], "template": {}},
+            },
+        }
+    )
+    store = CountingVectorStore()
+    node._set_built_object(store)
+    assert get_query_cache_id(store) is not None
+    documents = store.similarity_search("question", k=2)
+    assert store.similarity_search("question", k=2) == documents
+    assert store.queries == ["question"]
+    store.similarity_search("question", k=3)
+    store.similarity_search("question", k=2, filter={"source": "a"})
+    assert store.queries == ["question"] * 3
+    # Arguments by position, as some stores pass them
+    (document, _) = store.similarity_search("question", 2, {"source": "b"})
+    assert document.metadata == {"source": "b"}
+    store.similarity_search("question", 2, {"source": "b"})
+    assert store.queries == ["question"] * 4
+
+    # Rebuilding the store invalidates its results
+    node._set_built_object(CountingVectorStore())
+    store.similarity_search("question", k=2)
+    assert store.queries == ["question"] * 5
+
+    embeddings = CountingEmbeddings()
+    cached_embeddings = CachedEmbeddings(embeddings, get_cache_backend("test"))
+    assert cached_embeddings.embed_query("question") == [8.0, 4.0]
+    cached_embeddings.embed_query("question")
+    assert embeddings.embedded == ["question"]
@@ -1,5 +1,13 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest.mock import patch
+
 import pytest
 from fastapi.testclient import TestClient
+from langchain.chains.base import Chain
+from langflow.interface.run import get_result_and_thought
 from langflow.interface.tools.constants import CUSTOM_TOOLS
 
 
@@ -121,3 +129,81 @@ def test_various_prompts(client, prompt, expected_input_variables):
     assert response.json() == {
         "input_variables": expected_input_variables,
     }
+
+
+def test_get_cache_stats(client: TestClient):
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    stats = response.json()["data"]
+    assert "build_langchain_object_with_caching" in stats
+    assert {"hits", "misses", "evictions", "size"} <= set(stats["built_objects"])
+
+
+def test_get_executor_stats(client: TestClient):
+    response = client.get("/executor/stats")
+    assert response.status_code == 200
+    stats = response.json()["data"]
+    assert {"running", "queued", "completed", "rejected"} <= set(stats)
+
+
+class EchoChain(Chain):
+    """Prints its input while another call is running."""
+
+    barrier: Any
+    verbose: bool = True
+
+    @property
+    def input_keys(self):
+        return ["input"]
+
+    @property
+    def output_keys(self):
+        return ["output"]
+
+    def _call(self, inputs, run_manager=None):
+        run_manager.on_text(f"Thinking about {inputs['input']}")
+        # Both calls are running at this point
+        self.barrier.wait(5)
+        run_manager.on_text(f"Done with {inputs['input']}")
+        return {"output": inputs["input"].upper()}
+
+
+def test_concurrent_predict_calls(client: TestClient):
+    barrier = threading.Barrier(2)
+    stdout = sys.stdout
+
+    async def load_chain(data_graph, is_first_message=False):
+        return EchoChain(barrier=barrier)
+
+    def predict(message):
+        payload = {
+            "message": message,
+            "exported_flow": {
+                "description": "",
+                "name": "flow",
+                "id": "id",
+                "data": {"nodes": [], "edges": []},
+            },
+        }
+        return client.post("/predict", json=payload).json()["result"]
+
+    with patch(
+        "langflow.interface.run.aload_or_build_langchain_object", side_effect=load_chain
+    ):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(predict, ["first", "second"]))
+    assert results == ["FIRST", "SECOND"]
+    assert sys.stdout is stdout
+
+    # Each call gets its own thought
+    def get_thought(message):
+        barrier_chain = EchoChain(barrier=barrier)
+        return get_result_and_thought(barrier_chain, message)[1]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        thoughts = list(executor.map(get_thought, ["first", "second"]))
+    for message, thought in zip(["first", "second"], thoughts):
+        assert thought.count("Thinking about") == 1
+        assert f"Thinking about {message}" in thought
+        assert f"Done with {message}" in thought
+    assert sys.stdout is stdout
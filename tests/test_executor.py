@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+from langflow.interface.executor import ChainExecutor, ExecutorBusyError
+from langflow.interface.run import get_result_and_steps
+
+
+def test_chain_executor_is_bounded():
+    executor = ChainExecutor(max_workers=1, max_queue=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_call():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    running = executor.submit(blocking_call)
+    started.wait(5)
+    queued = executor.submit(lambda: "queued")
+    assert executor.stats()["running"] == 1
+    assert executor.stats()["queued"] == 1
+    with pytest.raises(ExecutorBusyError):
+        executor.submit(lambda: "rejected")
+
+    release.set()
+    assert running.result(5) == "done"
+    assert queued.result(5) == "queued"
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["running"] == stats["queued"] == 0
+    executor.shutdown()
+
+
+class SyncOnlyChain:
+    input_keys = ["input"]
+    output_keys = ["output"]
+
+    def __init__(self):
+        self.thread = None
+
+    async def acall(self, inputs, callbacks=None):
+        raise NotImplementedError("Async is not supported")
+
+    def __call__(self, inputs, callbacks=None):
+        self.thread = threading.current_thread()
+        return {"output": inputs["input"].upper()}
+
+
+def test_sync_chains_run_off_the_event_loop():
+    chain = SyncOnlyChain()
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            ticks += 1
+
+        result = await asyncio.gather(
+            get_result_and_steps(chain, "hello", websocket=None), tick()
+        )
+        return result[0], ticks
+
+    (result, thought), ticks = asyncio.run(run())
+    assert result == "HELLO"
+    assert thought == ""
+    assert ticks == 1
+    assert chain.thread is not threading.main_thread()
+    assert chain.thread.name.startswith("langflow-chain")
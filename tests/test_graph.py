@@ -1,9 +1,15 @@
+from types import SimpleNamespace
 from typing import Type, Union
 
 import pytest
+from langchain.chains import ConversationChain
 from langchain.chains.base import Chain
+from langchain.llms import OpenAI
 from langchain.llms.fake import FakeListLLM
+from langchain.memory import ConversationBufferMemory
 from langflow.graph import Edge, Graph, Node
+from langflow.graph.clone import ClonePolicy, clone_built_object, get_clone_policy
+from langflow.graph.compatibility import TypeCompatibility, type_compatibility
 from langflow.graph.nodes import (
     AgentNode,
     ChainNode,
@@ -14,7 +20,10 @@ from langflow.graph.nodes import (
     ToolNode,
     WrapperNode,
 )
+from langflow.graph.registry import node_registry
 from langflow.interface.run import get_result_and_thought
+from langflow.interface.utils import try_setting_streaming_options
+from langflow.settings import settings
 from langflow.utils.payload import get_root_node
 
 # Test cases for the graph module
@@ -167,6 +176,41 @@ def test_get_node(basic_graph):
     assert node.id == node_id
 
 
+def test_adjacency_index(complex_graph):
+    """Test that the adjacency lists match the edge list"""
+    for node in complex_graph.nodes:
+        incoming = complex_graph.get_incoming_edges(node)
+        outgoing = complex_graph.get_outgoing_edges(node)
+        assert incoming == [edge for edge in complex_graph.edges if edge.target == node]
+        assert outgoing == [edge for edge in complex_graph.edges if edge.source == node]
+        assert complex_graph.get_node(node.id) is node
+    assert complex_graph.get_node("missing") is None
+
+
+def test_node_registry():
+    """Test the node type registry index"""
+    info = node_registry.get_node_type_info(
+        "ZeroShotAgent", "zero-shot-react-description"
+    )
+    assert info.node_class is AgentNode
+    assert info.base_type == "agents"
+    info = node_registry.get_node_type_info("JsonSpec", "JsonSpec")
+    assert info.node_class is FileToolNode
+    assert node_registry.get_node_type_info("Unknown", "unknown").node_class is Node
+    assert node_registry.get_base_type("SQLDatabase") == "utilities"
+
+    # The index is rebuilt when the settings change
+    original_llms = settings.llms
+    try:
+        settings.llms = []
+        node_registry.refresh()
+        assert node_registry.get_node_type_info("OpenAI", "openai").node_class is Node
+    finally:
+        settings.llms = original_llms
+        node_registry.refresh()
+    assert node_registry.get_node_type_info("OpenAI", "openai").node_class is LLMNode
+
+
 def test_build_nodes(basic_graph):
     """Test building nodes"""
 
@@ -218,6 +262,37 @@ def test_matched_type(basic_graph):
     assert all(edge.matched_type in edge.source_types for edge in basic_graph.edges)
 
 
+def test_type_compatibility(complex_graph):
+    """Test the cached type matching of edges and params"""
+    compat = TypeCompatibility()
+    chain_id, llm_chain_id = compat.intern_all(["Chain", "LLMChain"])
+    assert compat.intern("Chain") == chain_id
+    assert compat.is_compatible(chain_id, llm_chain_id)
+    assert not compat.is_compatible(llm_chain_id, chain_id)
+    assert compat.match((llm_chain_id, chain_id), (llm_chain_id,)) == llm_chain_id
+    assert compat.match((llm_chain_id,), (chain_id,)) is None
+
+    # The caches keep the most recent pairs only
+    bounded = TypeCompatibility(maxsize=2)
+    type_ids = bounded.intern_all(["Chain", "LLMChain", "Tool", "BaseTool"])
+    for source_id in type_ids:
+        for target_id in type_ids:
+            bounded.is_compatible(source_id, target_id)
+    assert len(bounded.matrix) == 2
+    assert bounded.is_compatible(type_ids[2], type_ids[3])
+    assert not bounded.is_compatible(type_ids[1], type_ids[0])
+
+    for edge in complex_graph.edges:
+        assert edge.matched_type == type_compatibility.name(edge.matched_type_id)
+        # Every incoming edge is found from the input types of its target
+        target = edge.target
+        assert any(
+            edge in target.get_incoming_edges_by_type(value["type"])
+            for value in target.data["node"]["template"].values()
+            if isinstance(value, dict) and "type" in value
+        )
+
+
 def test_build_params(basic_graph):
     """Test building params"""
 
@@ -340,3 +415,51 @@ def test_get_result_and_thought(basic_graph):
     assert isinstance(result, str)
     # The thought should be a Thought
     assert isinstance(thought, str)
+
+
+def test_clone_policies():
+    """Test that built objects are copied according to their clone policy"""
+    llm = FakeListLLM(responses=["response"])
+    chain = ConversationChain(llm=llm, memory=ConversationBufferMemory())
+
+    assert get_clone_policy("ConversationChain", "chains") == ClonePolicy.MUTABLE_STATE
+    cloned_chain = clone_built_object(chain, ClonePolicy.MUTABLE_STATE)
+    assert cloned_chain is not chain
+    # Immutable pieces are shared, mutable state is copied
+    assert cloned_chain.llm is chain.llm
+    assert cloned_chain.memory is not chain.memory
+    cloned_chain.verbose = not chain.verbose
+    assert cloned_chain.verbose != chain.verbose
+    cloned_chain.memory.save_context({"input": "hi"}, {"response": "hello"})
+    assert chain.memory.buffer == ""
+
+    assert get_clone_policy("OpenAI", "llms") == ClonePolicy.SHALLOW
+    cloned_llm = clone_built_object(llm, ClonePolicy.SHALLOW)
+    assert cloned_llm is not llm
+    assert cloned_llm.responses is llm.responses
+
+    assert get_clone_policy("PromptTemplate", "prompts") == ClonePolicy.SHALLOW
+    assert get_clone_policy("SQLDatabase", "utilities") == ClonePolicy.SHARE
+    assert clone_built_object(llm, ClonePolicy.SHARE) is llm
+    assert get_clone_policy("Unknown", None) == ClonePolicy.DEEP
+
+
+def test_streaming_options_leave_the_built_objects_unchanged():
+    chain = ConversationChain(
+        llm=OpenAI(openai_api_key="sk-test", streaming=False),
+        memory=ConversationBufferMemory(),
+    )
+    llm, memory = chain.llm, chain.memory
+    agent = SimpleNamespace(llm_chain=chain)
+
+    streaming_chain = try_setting_streaming_options(chain, websocket=None)
+    assert streaming_chain.llm.streaming
+    assert not llm.streaming and chain.llm is llm
+    # The conversation is still kept in the memory of the client
+    assert streaming_chain.memory is memory
+
+    streaming_agent = try_setting_streaming_options(agent, websocket=None)
+    assert streaming_agent.llm_chain.llm.streaming
+    assert agent.llm_chain is chain and not llm.streaming
+    # Nothing to change, nothing is copied
+    assert try_setting_streaming_options(streaming_chain, None) is streaming_chain
@@ -4,6 +4,7 @@ import pytest
 from langchain.chains.base import Chain
 from langflow import load_flow_from_json
 from langflow.graph import Graph
+from langflow.graph.plan import PLAN_VERSION, ExecutionPlan, compile_flow
 from langflow.utils.payload import get_root_node
 
 
@@ -25,3 +26,46 @@ def test_get_root_node():
     assert root is not None
     assert hasattr(root, "id")
     assert hasattr(root, "data")
+
+
+def test_load_flow_from_plan(tmp_path):
+    """Test compiling a flow and loading the plan"""
+    with open(pytest.OPENAPI_EXAMPLE_PATH, "r") as f:
+        data_graph = json.load(f)["data"]
+    plan = compile_flow(data_graph)
+    assert plan.plan_version == PLAN_VERSION
+    assert plan.root in [node.id for node in plan.nodes]
+
+    plan_path = tmp_path / "plan.json"
+    plan.save(plan_path)
+    loaded_plan = ExecutionPlan.load(plan_path)
+    graph = loaded_plan.to_graph()
+    original = Graph(data_graph["nodes"], data_graph["edges"])
+    assert graph.compute_content_hashes() == original.compute_content_hashes()
+    # The root of the plan is used, it is not looked for again
+    assert graph.get_root_node().id == plan.root
+    graph._root_id = graph.nodes[0].id
+    assert graph.get_root_node() is graph.nodes[0]
+
+    loaded = load_flow_from_json(str(plan_path))
+    assert isinstance(loaded, Chain)
+    assert isinstance(load_flow_from_json(loaded_plan, build=False), Graph)
+
+    plan_data = json.loads(plan_path.read_text())
+    plan_data["plan_version"] = PLAN_VERSION + 1
+    with pytest.raises(ValueError):
+        ExecutionPlan.parse_plan(plan_data)
+
+
+def test_plan_classes_come_from_the_registry():
+    """Import paths in a plan are never used to resolve classes"""
+    with open(pytest.OPENAPI_EXAMPLE_PATH, "r") as f:
+        data_graph = json.load(f)["data"]
+    plan_data = json.loads(compile_flow(data_graph).json())
+    for plan_node in plan_data["nodes"]:
+        plan_node["class_path"] = "subprocess:run"
+    graph = ExecutionPlan.parse_plan(plan_data).to_graph()
+    original = Graph(data_graph["nodes"], data_graph["edges"])
+    for node in graph.nodes:
+        original_node = original.get_node(node.id)
+        assert node._get_class_object() is original_node._get_class_object()
@@ -1,7 +1,26 @@
+import asyncio
+import base64
 import json
+import sqlite3
+import time
+from types import SimpleNamespace
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
+from langchain.memory import ConversationBufferMemory
+from PIL import Image
+from langflow.api.callback import (
+    AsyncStreamingLLMCallbackHandler,
+    StreamBridge,
+    StreamingLLMCallbackHandler,
+)
+from langflow.api.chat import chat_manager
+from langflow.api.chat_manager import ChatHistory, encode_file_data, restore_memory
+from langflow.api.schemas import ChatMessage, ChatResponse, FileResponse
+from langflow.api.sessions import SQLiteSessionStore, create_session_store
+from langflow.cache import cache_manager
+from langflow.settings import settings
 
 
 def test_websocket_connection(client: TestClient):
@@ -45,3 +64,315 @@ def test_chat_history(client: TestClient):
                 "intermediate_steps": "",
                 "files": [],
             }
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, data):
+        self.frames.append(data)
+
+
+def test_streamed_tokens_are_coalesced():
+    async def stream():
+        websocket = FakeWebSocket()
+        handler = AsyncStreamingLLMCallbackHandler(websocket)
+        handler.stream.flush_interval = 10
+        handler.stream.flush_bytes = 8
+        for token in ["Hel", "lo", " wor", "ld", "!"]:
+            await handler.on_llm_new_token(token)
+        # Flushed once the tokens reached 8 bytes
+        assert [frame["message"] for frame in websocket.frames] == ["Hello wor"]
+        await handler.on_llm_end(None)
+        return websocket.frames
+
+    frames = asyncio.run(stream())
+    assert [frame["message"] for frame in frames] == ["Hello wor", "ld!"]
+    assert all(frame["type"] == "stream" for frame in frames)
+
+
+def test_streamed_tokens_are_flushed_after_interval():
+    async def stream():
+        websocket = FakeWebSocket()
+        handler = AsyncStreamingLLMCallbackHandler(websocket)
+        handler.stream.flush_interval = 0.01
+        handler.stream.flush_bytes = 1000
+        await handler.on_llm_new_token("Hello")
+        assert websocket.frames == []
+        await asyncio.sleep(0.05)
+        return websocket.frames
+
+    frames = asyncio.run(stream())
+    assert [frame["message"] for frame in frames] == ["Hello"]
+
+
+def test_sync_streamed_tokens_are_flushed_on_end():
+    async def stream():
+        websocket = FakeWebSocket()
+        handler = StreamingLLMCallbackHandler(websocket)
+        handler.bridge.stream.flush_interval = 10
+
+        def generate():
+            for token in ["Hello", " ", "world"]:
+                handler.on_llm_new_token(token)
+            handler.on_llm_end(None)
+            # Sent by the time the LLM ends
+            assert [frame["message"] for frame in websocket.frames] == ["Hello world"]
+
+        await asyncio.get_running_loop().run_in_executor(None, generate)
+        await handler.bridge.aclose()
+        return websocket.frames
+
+    frames = asyncio.run(stream())
+    assert [frame["message"] for frame in frames] == ["Hello world"]
+
+
+class SlowWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_json(self, data):
+        await self.release.wait()
+        await super().send_json(data)
+
+
+def test_stream_bridge_drops_tokens_for_slow_clients():
+    async def stream():
+        websocket = SlowWebSocket()
+        bridge = StreamBridge(websocket, max_queued=2, put_timeout=0)
+        bridge.stream.flush_interval = 0
+
+        def generate():
+            return [bridge.put(str(index)) for index in range(10)]
+
+        queued = await asyncio.get_running_loop().run_in_executor(None, generate)
+        websocket.release.set()
+        await bridge.aclose()
+        return queued, bridge, websocket.frames
+
+    queued, bridge, frames = asyncio.run(stream())
+    # The queue never held more than two tokens
+    assert bridge.dropped == queued.count(False) >= 7
+    assert len(frames) == queued.count(True)
+
+
+def test_stream_bridge_waits_once_for_stuck_clients():
+    async def stream():
+        websocket = SlowWebSocket()
+        bridge = StreamBridge(
+            websocket, max_queued=1, put_timeout=0.1, flush_timeout=0.1
+        )
+        bridge.stream.flush_interval = 0
+
+        def generate():
+            start = time.perf_counter()
+            queued = [bridge.put(str(index)) for index in range(20)]
+            bridge.flush()
+            return queued, time.perf_counter() - start
+
+        queued, elapsed = await asyncio.get_running_loop().run_in_executor(
+            None, generate
+        )
+        # The client never reads, closing doesn't wait forever either
+        await bridge.aclose()
+        return queued, elapsed
+
+    queued, elapsed = asyncio.run(stream())
+    assert queued.count(True) <= 2
+    # A single put timeout and the flush timeout, not one wait per token
+    assert elapsed < 1
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def session_store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    return create_session_store(request.param)
+
+
+def test_chat_history_is_bounded(session_store, monkeypatch):
+    monkeypatch.setattr(settings, "chat_history_max_messages", 4)
+    monkeypatch.setattr(settings, "chat_history_max_bytes", 30)
+    history = ChatHistory(session_store)
+    for index in range(3):
+        history.add_message("client", ChatMessage(message=f"question {index}"))
+        history.add_message(
+            "client", ChatResponse(message=None, type="start", intermediate_steps="")
+        )
+    # Four messages at most
+    assert len(history.get_history("client", filter=False)) == 4
+    assert [message.message for message in history.get_history("client")] == [
+        "question 1",
+        "question 2",
+    ]
+    # 30 bytes at most
+    history.add_message("client", ChatMessage(message="a" * 25))
+    assert [message.message for message in history.get_history("client")] == ["a" * 25]
+
+
+def test_sqlite_history_is_trimmed_when_the_bound_is_lowered(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    history = ChatHistory(create_session_store("sqlite"))
+    for index in range(10):
+        history.add_message("client", ChatMessage(message=str(index)))
+    monkeypatch.setattr(settings, "chat_history_max_messages", 3)
+    history.add_message("client", ChatMessage(message="10"))
+    assert [message.message for message in history.get_history("client")] == [
+        "8",
+        "9",
+        "10",
+    ]
+
+
+def test_chat_history_pages_and_idle_eviction(session_store):
+    history = ChatHistory(session_store)
+    for index in range(10):
+        history.add_message("client", ChatMessage(message=str(index)))
+    messages, total = history.get_history_page("client", limit=3)
+    assert [message.message for message in messages] == ["7", "8", "9"]
+    assert total == 10
+    messages, _ = history.get_history_page("client", offset=8, limit=3)
+    assert [message.message for message in messages] == ["0", "1"]
+
+    history.add_message("other", ChatMessage(message="hi"))
+    time.sleep(0.01)
+    history.evict_idle(0, active=["other"])
+    assert history.get_history("client") == []
+    assert len(history.get_history("other")) == 1
+
+
+def test_chat_history_last_turn(session_store):
+    history = ChatHistory(session_store)
+    assert history.count_messages("client") == 0
+    assert history.get_last_message("client") is None
+    history.add_message("client", FileResponse(data="old", data_type="csv"))
+    history.add_message("client", ChatMessage(message="Plot it"))
+    history.add_message("client", FileResponse(data="a,b", data_type="csv"))
+    history.add_message(
+        "client", ChatResponse(message=None, type="stream", intermediate_steps="")
+    )
+    assert history.count_messages("client") == 3
+    assert history.get_last_message("client").type == "stream"
+    last_turn = history.get_last_turn("client")
+    assert [message.type for message in last_turn] == ["file", "stream"]
+    assert last_turn[0].data == "a,b"
+
+
+def test_chat_history_replay_is_paginated(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "chat_history_page_size", 2)
+    for index in range(3):
+        chat_manager.chat_history.add_message(
+            "paged_client", ChatMessage(message=str(index))
+        )
+    with client.websocket_connect("/chat/paged_client") as websocket:
+        history = websocket.receive_json()
+        assert [message["message"] for message in history] == ["1", "2"]
+        websocket.send_json(json.dumps({"get_history": {"offset": 2}}))
+        page = websocket.receive_json()
+        assert page["type"] == "history"
+        assert page["total"] == 3
+        assert [message["message"] for message in page["messages"]] == ["0"]
+        # A malformed request gets an error, the connection stays open
+        for request in [True, {"offset": "2"}, {"limit": -1}]:
+            websocket.send_json(json.dumps({"get_history": request}))
+            assert websocket.receive_json()["type"] == "error"
+        websocket.send_json(json.dumps({"get_history": {}}))
+        assert websocket.receive_json()["total"] == 3
+    chat_manager.chat_history.empty_history("paged_client")
+
+
+def test_idle_sessions_are_evicted_while_connected(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "chat_history_idle_ttl", 0)
+    chat_manager._evicted_at = float("-inf")
+    chat_manager.chat_history.add_message("idle_client", ChatMessage(message="hi"))
+    time.sleep(0.01)
+    with client.websocket_connect("/chat/active_client") as websocket:
+        websocket.receive_json()
+        assert chat_manager.chat_history.get_history("idle_client") == []
+
+
+def test_sessions_are_shared_by_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    worker = ChatHistory(create_session_store("sqlite"))
+    other_worker = ChatHistory(create_session_store("sqlite"))
+    worker.add_message("client", ChatMessage(message="Hello"))
+    worker.add_message(
+        "client", ChatResponse(message="Hi!", type="end", intermediate_steps="")
+    )
+    worker.store.update_metadata("client", worker=1)
+
+    # The client reconnects to another worker
+    history = other_worker.get_history("client")
+    assert [message.message for message in history] == ["Hello", "Hi!"]
+    assert isinstance(history[1], ChatResponse)
+    assert other_worker.store.get_metadata("client") == {"worker": 1}
+    other_worker.empty_history("client")
+    assert worker.get_history("client") == []
+    assert worker.store.get_metadata("client") == {}
+
+
+def test_files_are_stored_encoded():
+    chat_manager.active_connections["file_client"] = None  # type: ignore
+    try:
+        with cache_manager.set_client_id("file_client"):
+            cache_manager.add_image("plot", Image.new("RGB", (8, 8)))
+        (message,) = chat_manager.chat_history.get_history("file_client", filter=False)
+        assert isinstance(message.data, str)
+        # The size of the history is the size of what is sent
+        session = chat_manager.chat_history.store.sessions["file_client"]
+        assert session.bytes == len(message.data)
+    finally:
+        chat_manager.active_connections.pop("file_client")
+        chat_manager.chat_history.empty_history("file_client")
+
+
+def test_sqlite_sessions_store_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    history = ChatHistory(create_session_store("sqlite"))
+    image = Image.new("RGB", (2, 2))
+    history.add_message(
+        "client",
+        FileResponse(data=encode_file_data(image, "image"), data_type="image"),
+    )
+    (message,) = history.get_history("client")
+    assert isinstance(message, FileResponse)
+    assert base64.b64decode(message.data).startswith(b"\x89PNG")
+    # Plain JSON, nothing is unpickled when the history is read
+    with sqlite3.connect(history.store.path) as connection:
+        (data,) = connection.execute("SELECT data FROM messages").fetchone()
+    assert json.loads(data)["class"] == "FileResponse"
+
+
+def test_restore_memory_from_the_session():
+    chain = SimpleNamespace(memory=ConversationBufferMemory())
+    history = [
+        ChatMessage(message="Hello"),
+        ChatResponse(message="Hi!", type="end", intermediate_steps=""),
+        ChatMessage(message="How are you?"),
+    ]
+
+    async def load_history():
+        return history
+
+    asyncio.run(restore_memory(chain, load_history))
+    # The question being answered is added by the chain itself
+    messages = chain.memory.chat_memory.messages
+    assert [message.content for message in messages] == ["Hello", "Hi!"]
+    # A memory that is in use is kept
+    asyncio.run(restore_memory(chain, load_history))
+    assert len(chain.memory.chat_memory.messages) == 2
+
+
+def test_session_store_is_created_per_process(tmp_path, monkeypatch):
+    history = ChatHistory()
+    store = history.store
+    assert history.store is store
+    # A config loaded after the import selects another store
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "session_store", "sqlite")
+    assert isinstance(history.store, SQLiteSessionStore)
+    sqlite_store = history.store
+    # A forked worker opens its own connection
+    with patch("langflow.api.sessions.os.getpid", return_value=-1):
+        assert history.store is not sqlite_store